@@ -53,26 +53,147 @@
 # \date September 6, 2018
 
 
-import random                   # random number
+import array                    # compact coordinates of objects
 import numpy as np              # numpy arrays
-import matplotlib.pyplot as plt # for plotting
 import sys                      # system exit
 import time                     # runtime meaurement
-
-
-## Sphere serves as superclass for the two spherical objects indroduced below.
+import tracemalloc              # peak memory measurement
+import os                       # file handling of recordings
+import json                     # profiling reports, benchmark results, batch files
+import platform                 # benchmark metadata
+import csv                      # profiling reports
+import hashlib                  # keys of the result cache
+import argparse                 # batch command line
+from operator import attrgetter, is_ # checks of shared coordinates
+from itertools import repeat
+from statistics import NormalDist # confidence intervals
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed # parallel sweeps and slabs
+import importlib.util           # optional Numba, imported on first use by Engine_numba
+
+
+## RandomStream is the source of all random numbers of a Simulation. It wraps a NumPy Generator with the bit generator
+# PCG64 or Philox, seeded by a SeedSequence, so a run is reproducible bit for bit from one seed, and \c spawn derives
+# independent child streams for replicates, slabs and workers. Vectorized code draws whole arrays from \c generator.
+# The object-based Wells draw moves, placements and binding draws from a block of \c block_size uniform numbers
+# generated at once, so a single draw doesn't cost a call into NumPy. The numbers drawn don't depend on \c block_size.
+#
+# \param[in] seed          Seed, SeedSequence, or None (fresh entropy)
+# \param[in] bit_generator Name of the bit generator: "PCG64" or "Philox"
+# \param[in] block_size    Number of uniform numbers generated at once
+# \param     generator     NumPy random Generator
+class RandomStream:
+    bit_generators = {"PCG64": np.random.PCG64, "Philox": np.random.Philox}
+    ## Stream of objects created without a Simulation (see \c default).
+    shared = None
+
+    def __init__(self, seed=None, bit_generator="PCG64", block_size=65536):
+        if bit_generator not in self.bit_generators:
+            sys.exit("Unknown bit generator! Please choose one of " + ", ".join(self.bit_generators) + ".")
+        self.seed_sequence = seed if isinstance(seed, np.random.SeedSequence) else np.random.SeedSequence(seed)
+        self.bit_generator = bit_generator
+        self.block_size = block_size
+        self.generator = np.random.Generator(self.bit_generators[bit_generator](self.seed_sequence))
+        self.block = np.empty(0)
+        self.position = 0
+
+    ## Returns the stream used by Glycan, Lectin and the Wells if no stream of a Simulation is given (fresh entropy,
+    # created on first use).
+    @classmethod
+    def default(cls):
+        if cls.shared is None:
+            cls.shared = cls()
+        return cls.shared
+
+    ## Returns \c n independent child streams with the same bit generator and block size.
+    def spawn(self, n):
+        return [RandomStream(s, self.bit_generator, self.block_size) for s in self.seed_sequence.spawn(n)]
+
+    ## Returns an array of \c n uniform numbers in [0, 1) from the current block, generating the next block if needed.
+    def uniforms(self, n):
+        if self.position + n > len(self.block):
+            self.block = np.concatenate([self.block[self.position:], self.generator.random(max(self.block_size, n))])
+            self.position = 0
+        values = self.block[self.position:self.position + n]
+        self.position += n
+        return values
+
+    ## Returns an array of \c n integers in [0, \c high).
+    def integers(self, high, n):
+        return np.minimum((self.uniforms(n) * high).astype(np.int64), high - 1)
+
+    ## Returns a uniform number in [\c low, \c high).
+    def uniform(self, low, high):
+        if self.position == len(self.block):
+            self.block = self.generator.random(self.block_size)
+            self.position = 0
+        self.position += 1
+        return low + (high - low) * float(self.block[self.position - 1])
+
+    ## Returns an integer in [\c low, \c high], both included (like random.randint).
+    def randint(self, low, high):
+        return low + min(int(self.uniform(0, high - low + 1)), high - low)
+
+    ## Returns a random element of a non-empty sequence.
+    def choice(self, sequence):
+        return sequence[self.randint(0, len(sequence) - 1)]
+
+    ## Returns random coordinates between 0 and \c size (included) in every dimension.
+    def coordinates(self, size):
+        return [self.randint(0, int(s)) for s in size]
+
+
+## Sphere serves as superclass for the two spherical objects indroduced below. Spheres and their subclasses use
+# __slots__ instead of a __dict__, so only the attributes documented here can be set.
+#
+# In a Well_list, the coordinates of all Beads (or all DecoderCells) are kept in one shared int array of the Well
+# (\c store), and \c coordinates returns a view of the three entries of the Sphere, which can be changed in place.
+# Without an ID, \c ID is built on access from the class name and \c number, so no string is stored per Sphere.
 #
-# \param[in] ID          Identifier
-# \param     coordinates Empty. Will be filled when added to Well.
+# \param[in] ID          Identifier (optional, default: class name and \c number, e. g. "Bead_7")
+# \param     coordinates Empty. Will be filled when added to Well (view of the shared array for Well_list).
+# \param     store       Shared int array holding the coordinates (None: coordinates are stored in the Sphere)
+# \param     number      Position of the Sphere in its Well
 
 class Sphere:
-    def __init__(self, ID_string):
-        self.ID = ID_string
-        self.coordinates = []
+    __slots__ = ("_ID", "_coordinates", "store", "number")
+
+    def __init__(self, ID_string=None):
+        self._ID = ID_string
+        self.store = None
+        self.number = None
+
+    @property
+    def ID(self):
+        if self._ID is None:
+            return type(self).__name__ + "_" + str(self.number)
+        return self._ID
+
+    @ID.setter
+    def ID(self, ID_string):
+        self._ID = ID_string
+
+    @property
+    def coordinates(self):
+        if self.store is not None:
+            return memoryview(self.store)[3 * self.number:3 * self.number + 3]
+        try:
+            return self._coordinates
+        except AttributeError: # no list allocated before the Sphere is added to a Well
+            self._coordinates = []
+            return self._coordinates
+
+    @coordinates.setter
+    def coordinates(self, coordinates_list):
+        if self.store is not None:
+            self.store[3 * self.number:3 * self.number + 3] = array.array("i", coordinates_list)
+        else:
+            self._coordinates = coordinates_list
 
 ## Bead is a subclass of Sphere and represents beads (made of acrylic glass) loaded with glycan structures.
 
 class Bead(Sphere):
+    __slots__ = ("glycan", "glycan_density")
+
     def __init__(self, *args):
         super().__init__(*args)
 
@@ -82,7 +203,8 @@ class Bead(Sphere):
     # \param[in] glycan_names_list  see documentation for class Glycan
     # \param[in] glycan_types_list  see documentation for class Glycan
     # \param[in] density_percentage Density of respective Glycan on Bead (0--100 \%).
-    def attachGlycans(self, glycan_names_list, glycan_types_list, density_percentage):
+    # \param[in] stream             RandomStream choosing the Glycan (optional, see class Glycan)
+    def attachGlycans(self, glycan_names_list, glycan_types_list, density_percentage, stream=None):
         if density_percentage > 100:
             print("Given density_percentage higher than 100%! Value was set to 100%")
             self.glycan_density = 100
@@ -91,7 +213,7 @@ class Bead(Sphere):
             self.glycan_density = 0
         else:
             self.glycan_density = density_percentage
-        self.glycan = Glycan(glycan_names_list, glycan_types_list)
+        self.glycan = Glycan(glycan_names_list, glycan_types_list, stream)
 
 
 ## \brief Objects of the class Glycan are attached to objects of the class Bead. They represent Glycan structures which
@@ -103,19 +225,46 @@ class Bead(Sphere):
 # \param[in] glycan_types_list List of Strings containing the respective types of Glycan structures. These types
 # determine the outcome of the interaction between Bead and DecoderCell as specified in the cytokine dictionary. If the
 # this list does not contain the same number of member as \c glycan_names_list, the program terminates.
+# \param[in] stream            RandomStream choosing the entry (optional, default: RandomStream.default()).
+#
+# Glycans are flyweights: there is only one immutable instance per pair of name and type, shared by all Beads.
 
 class Glycan:
-    def __init__(self, glycan_names_list, glycan_types_list):
+    __slots__ = ("name", "type")
+    instances = {}
+
+    def __new__(cls, glycan_names_list, glycan_types_list, stream=None):
         if len(glycan_names_list) != len(glycan_types_list):
             sys.exit("List of Glycan names and types don't have the same number of entries. Program terminated!")
-        r = random.randint(0, len(glycan_types_list)-1) # random choice of entry
-        self.name = glycan_names_list[r]
-        self.type = glycan_types_list[r]
+        r = (stream or RandomStream.default()).randint(0, len(glycan_types_list)-1) # random choice of entry
+        return cls.intern(glycan_names_list[r], glycan_types_list[r])
+
+    ## Returns the instance with the given name and type, creating it on first use.
+    @classmethod
+    def intern(cls, name, type):
+        glycan = cls.instances.get((name, type))
+        if glycan is None:
+            glycan = object.__new__(cls)
+            object.__setattr__(glycan, "name", name)
+            object.__setattr__(glycan, "type", type)
+            cls.instances[(name, type)] = glycan
+        return glycan
+
+    def __setattr__(self, name, value):
+        raise AttributeError("Glycan objects are shared by all Beads and can't be changed!")
+
+    def __delattr__(self, name):
+        raise AttributeError("Glycan objects are shared by all Beads and can't be changed!")
+
+    def __reduce__(self):
+        return (Glycan.intern, (self.name, self.type))
 
 
 ## \brief DecoderCell is a subclass of Sphere and represents immune cells, i. e. monocytes, that express Lectins
 # which bind to Glycan structures and engage in immune response by secreting Cytokines.
 class DecoderCell(Sphere):
+    __slots__ = ("lectin", "lectin_density")
+
     def __init__(self, *args):
         super().__init__(*args)
 
@@ -124,7 +273,8 @@ class DecoderCell(Sphere):
     #
     # \param[in] lectin_list        see documentation for class Lectin
     # \param[in] density_percentage Density of respective Lectin on DecoderCell (0--100 \%).
-    def expressLectins(self, lectin_list, density_percentage):
+    # \param[in] stream             RandomStream choosing the Lectin (optional, see class Lectin)
+    def expressLectins(self, lectin_list, density_percentage, stream=None):
         if density_percentage > 100:
             print("Given density_percentage higher than 100%! Value was set to 100%")
             self.lectin_density = 100
@@ -133,7 +283,7 @@ class DecoderCell(Sphere):
             self.lectin_density = 0
         else:
             self.lectin_density = density_percentage
-        self.lectin = Lectin(lectin_list)
+        self.lectin = Lectin(lectin_list, stream)
 
 
 ## Objects of the class Lectin are attached to objects of the class DecoderCell. They represent lectin receptors
@@ -142,9 +292,34 @@ class DecoderCell(Sphere):
 #
 # \param[in] lectin_list List of Strings containing the names of Lectin receptors to be added to the DecoderCell. These
 # names appear in the dictionary. List may contain any number of members, including 0.
+# \param[in] stream      RandomStream choosing the entry (optional, default: RandomStream.default()).
+#
+# Lectins are flyweights: there is only one immutable instance per name, shared by all DecoderCells.
 class Lectin:
-    def __init__(self, lectin_list):
-        self.name = random.choice(lectin_list)
+    __slots__ = ("name",)
+    instances = {}
+
+    def __new__(cls, lectin_list, stream=None):
+        return cls.intern((stream or RandomStream.default()).choice(lectin_list))
+
+    ## Returns the instance with the given name, creating it on first use.
+    @classmethod
+    def intern(cls, name):
+        lectin = cls.instances.get(name)
+        if lectin is None:
+            lectin = object.__new__(cls)
+            object.__setattr__(lectin, "name", name)
+            cls.instances[name] = lectin
+        return lectin
+
+    def __setattr__(self, name, value):
+        raise AttributeError("Lectin objects are shared by all DecoderCells and can't be changed!")
+
+    def __delattr__(self, name):
+        raise AttributeError("Lectin objects are shared by all DecoderCells and can't be changed!")
+
+    def __reduce__(self):
+        return (Lectin.intern, (self.name,))
 
 
 ## Objects of class Cytokine are produced if objects of the classes Bead and DecoderCell containing the correct pair of
@@ -153,20 +328,115 @@ class Lectin:
 # \param[in] name             Name of the Cytokine.
 # \param[in] coordinates_list List containing the three values for x, y, and z, where the Cytokine was produced.
 class Cytokine:
+    __slots__ = ("name", "coordinates")
+
     def __init__(self, name, coordinates_list):
         self.name = name
         self.coordinates = coordinates_list
 
 
-## The class Well describes the sample, in which binding events take place. It serves a a superclass for two subclasses
-# of which one uses NumPy Arrays as a container for objects of the classes Bead and DecoderCell while the other one uses
-# built-in Python lists for this purpose.
+## CytokineBuffer stores binding events column-wise in a preallocated NumPy structured array instead of a list of
+# objects of class Cytokine. Every event records the step, the DecoderCell and Bead numbers, the code of the Cytokine
+# (index in \c names) and a snapshot of the coordinates of production. The array grows by doubling, so appending is
+# amortized O(1). For compatibility, the buffer can be indexed and iterated like a list of Cytokine objects.
+#
+# \param[in] capacity Initial number of events the buffer can hold.
+# \param     names    List of Cytokine names; the code of an event is the index of its name in this list.
+class CytokineBuffer:
+    dtype = np.dtype([("step", np.int32), ("cell", np.int32), ("bead", np.int32), ("cytokine", np.int16),
+                      ("x", np.int32), ("y", np.int32), ("z", np.int32)])
+
+    def __init__(self, capacity=1024):
+        self.data = np.zeros(capacity, dtype=self.dtype)
+        self.n = 0
+        self.names = []
+
+    def __len__(self):
+        return self.n
+
+    ## Returns event i as an object of class Cytokine.
+    def __getitem__(self, i):
+        event = self.view()[i]
+        return Cytokine(self.names[event["cytokine"]], [int(event["x"]), int(event["y"]), int(event["z"])])
+
+    def __iter__(self):
+        for i in range(self.n):
+            yield self[i]
+
+    ## Returns the code of a Cytokine name. Unknown names are appended to \c names.
+    #
+    # \param[in] name Name of the Cytokine.
+    def code(self, name):
+        if name not in self.names:
+            self.names.append(name)
+        return self.names.index(name)
+
+    ## Makes sure that \c additional more events fit into the buffer, doubling its capacity as often as necessary.
+    def reserve(self, additional):
+        capacity = len(self.data)
+        while self.n + additional > capacity:
+            capacity = 2 * max(capacity, 1)
+        if capacity > len(self.data):
+            data = np.zeros(capacity, dtype=self.dtype)
+            data[:self.n] = self.data[:self.n]
+            self.data = data
+
+    ## Appends a single event.
+    #
+    # \param[in] step        Step number.
+    # \param[in] cell        Number of the DecoderCell.
+    # \param[in] bead        Number of the Bead.
+    # \param[in] name        Name of the Cytokine.
+    # \param[in] coordinates List or array containing the three values for x, y, and z. They are copied.
+    def append(self, step, cell, bead, name, coordinates):
+        self.reserve(1)
+        self.data[self.n] = (step, cell, bead, self.code(name), coordinates[0], coordinates[1], coordinates[2])
+        self.n += 1
+
+    ## Appends a batch of events at once.
+    #
+    # \param[in] step      Step number (scalar or array).
+    # \param[in] cells     Array with the numbers of the DecoderCells.
+    # \param[in] beads     Array with the numbers of the Beads.
+    # \param[in] codes     Array with the codes of the Cytokines.
+    # \param[in] positions Array of shape (n, 3) with the coordinates of production. They are copied.
+    def extend(self, step, cells, beads, codes, positions):
+        count = len(cells)
+        self.reserve(count)
+        events = self.data[self.n:self.n + count]
+        events["step"] = step
+        events["cell"] = cells
+        events["bead"] = beads
+        events["cytokine"] = codes
+        events["x"] = positions[:, 0]
+        events["y"] = positions[:, 1]
+        events["z"] = positions[:, 2]
+        self.n += count
+
+    ## Appends events given as a structured array of dtype \c dtype (e. g. a chunk of a recording). They are copied.
+    def extendEvents(self, events):
+        self.reserve(len(events))
+        self.data[self.n:self.n + len(events)] = events
+        self.n += len(events)
+
+    ## Returns the recorded events as a structured array. This is a view, i. e. no data is copied.
+    def view(self):
+        return self.data[:self.n]
+
+
+## The class Well describes the sample, in which binding events take place. It serves a a superclass for three subclasses
+# of which one uses NumPy Arrays as a container for objects of the classes Bead and DecoderCell while another one uses
+# built-in Python lists for this purpose. The third one, Well_vectorized, doesn't store objects at all but keeps the
+# properties of all particles in parallel NumPy Arrays.
 #
 # \param[in] x, y, z Size of the well.
+# \param     stream  RandomStream placing the particles and choosing their Glycans and Lectins (set by
+#                    Simulation.createModel, default: RandomStream.default())
 class Well:
     def __init__(self, x, y, z):
         if x <= 0 or y <= 0 or z <= 0:
             sys.exit("Illegal Well dimensions! Please enter values larger than zero!")
+        self.stream = RandomStream.default()
 
     ## The method borderControl ensures that objects' coordinates don't exceed the Well's size. If a step in \c randomWalk
     # would lead to a forbidden value, the sign of the respective step value will be reversed so the object "bounces
@@ -176,20 +446,25 @@ class Well:
     # \param[in]  dx, dy, dz  The randomly chosen next steps.
     # \param[out] dx, dy, dz  The revised next steps.
     def borderControl(self, coordinates, dx, dy, dz):
-        coordinates[0] = coordinates[0] + dx
-        coordinates[1] = coordinates[1] + dy
-        coordinates[2] = coordinates[2] + dz
-        if self.size[0] < abs(coordinates[0]) or 0 > coordinates[0]:
+        if self.size[0] < coordinates[0] + dx or 0 > coordinates[0] + dx:
             dx = -dx
-        if self.size[1] < abs(coordinates[1]) or 0 > coordinates[1]:
+        if self.size[1] < coordinates[1] + dy or 0 > coordinates[1] + dy:
             dy = -dy
-        if self.size[2] < abs(coordinates[2]) or 0 > coordinates[2]:
+        if self.size[2] < coordinates[2] + dz or 0 > coordinates[2] + dz:
             dz = -dz
         return dx, dy, dz
 
+    ## Returns the coordinates of the given objects as array of shape (n, 3).
+    #
+    # \param[in] particles List or array of objects of class Bead or DecoderCell.
+    def coordinateArray(self, particles):
+        return np.array([particle.coordinates for particle in particles]).reshape(-1, 3)
+
 ## Subclass of Well using built-in python lists as containers for objects of the classes Bead and DecoderCell. \c n_beads
 # and \c n_cells are not used by this class, but by the constructor of Well_npArray. It is necessary to have them here
-# to allow convenient switching between Lists and NumPy Arrays.
+# to allow convenient switching between Lists and NumPy Arrays. The coordinates of all Beads and of all DecoderCells are
+# stored in the int arrays \c bead_coordinates and \c cell_coordinates (x, y, z of every particle in turn), which the
+# particles share (see class Sphere).
 #
 # \param[in] x, y, z Size of the Well.
 # \param     n_beads -- not used here --
@@ -200,6 +475,8 @@ class Well_list(Well):
         self.size=[x, y, z]
         self.beads = []
         self.decoderCells = []
+        self.bead_coordinates = array.array("i")
+        self.cell_coordinates = array.array("i")
 
     ## Method to add objects of class Bead to the bead list. Coordinates of the Bead are randomly chosen between 0 and
     # size of the Well in the respective dimension.
@@ -210,9 +487,10 @@ class Well_list(Well):
     # \param[in] glycan_type_string see documentation for class Glycan
     # \param[in] density_percentage see documentation for class Glycan
     def addBead(self, i, bead, glyan_name_string, glycan_type_string, density_percentage):
+        self.bead_coordinates.extend(self.stream.coordinates(self.size))
+        bead.store, bead.number = self.bead_coordinates, len(self.beads)
         self.beads.append(bead)
-        bead.coordinates = [random.randint(0, self.size[0]), random.randint(0, self.size[1]), random.randint(0, self.size[2])]
-        bead.attachGlycans(glyan_name_string, glycan_type_string, density_percentage)
+        bead.attachGlycans(glyan_name_string, glycan_type_string, density_percentage, self.stream)
 
     ## Method to add objects of class DecoderCell to the decoderCell list. Coordinates of the DecoderCell are randomly
     # chosen between 0 and size of the Well in the respective dimension.
@@ -222,9 +500,35 @@ class Well_list(Well):
     # \param[in] lectin_name_string see documentation for class Lectin
     # \param[in] density_percentage see documentation for class Lectin
     def addDecoderCell(self, i, decoderCell, lectin_name_string, density_percentage):
+        self.cell_coordinates.extend(self.stream.coordinates(self.size))
+        decoderCell.store, decoderCell.number = self.cell_coordinates, len(self.decoderCells)
         self.decoderCells.append(decoderCell)
-        decoderCell.coordinates = [random.randint(0, self.size[0]), random.randint(0, self.size[1]), random.randint(0, self.size[2])]
-        decoderCell.expressLectins(lectin_name_string, density_percentage)
+        decoderCell.expressLectins(lectin_name_string, density_percentage, self.stream)
+
+    ## Returns the shared arrays holding the coordinates of all Beads and of all DecoderCells in list order. An entry is
+    # None if its list was changed other than by \c addBead or \c addDecoderCell (e. g. particles removed or inserted).
+    def coordinateStores(self):
+        stores = []
+        for particles, store in ((self.beads, self.bead_coordinates), (self.decoderCells, self.cell_coordinates)):
+            ordered = len(store) == 3 * len(particles) and self.shares(particles, store) and list(map(attrgetter("number"), particles)) == list(range(len(particles)))
+            stores.append(store if ordered else None)
+        return stores
+
+    ## Returns the coordinates of the given objects as array of shape (n, 3). If all of them are stored in the same
+    # shared array of the Well, their rows are taken from it at once; otherwise, coordinates are converted element by
+    # element.
+    #
+    # \param[in] particles List of objects of class Bead or DecoderCell.
+    def coordinateArray(self, particles):
+        for store in (self.bead_coordinates, self.cell_coordinates):
+            if self.shares(particles, store):
+                return np.frombuffer(store, dtype=np.intc).reshape(-1, 3)[list(map(attrgetter("number"), particles))].reshape(-1, 3)
+        return super().coordinateArray(particles)
+
+    ## Returns whether the coordinates of all given particles are stored in \c store.
+    @staticmethod
+    def shares(particles, store):
+        return all(map(is_, map(attrgetter("store"), particles), repeat(store)))
 
 ## Subclass of Well using NumPy Arrays as containers for objects of the classes Bead and DecoderCell.
 #
@@ -248,8 +552,9 @@ class Well_npArray(Well):
     # \param[in] density_percentage see documentation for class Glycan
     def addBead(self, i, bead, glycan_name_string, glycan_type_string, density_percentage):
         self.beads[i]=bead
-        bead.coordinates = np.array([random.randint(0, self.size[0]), random.randint(0, self.size[1]), random.randint(0, self.size[2])])
-        bead.attachGlycans(glycan_name_string, glycan_type_string, density_percentage)
+        bead.number = i
+        bead.coordinates = np.array(self.stream.coordinates(self.size))
+        bead.attachGlycans(glycan_name_string, glycan_type_string, density_percentage, self.stream)
 
     ## Method to add objects of class DecoderCell to the decoderCell array. Coordinates of the DecoderCell are randomly
     # chosen between 0 and size of the Well in the respective dimension.
@@ -260,8 +565,959 @@ class Well_npArray(Well):
     # \param[in] density_percentage see documentation for class Lectin
     def addDecoderCell(self, i, decoderCell, lectin_name_string, density_percentage):
         self.decoderCells[i] = decoderCell
-        decoderCell.coordinates = np.array([random.randint(0, self.size[0]), random.randint(0, self.size[1]), random.randint(0, self.size[2])])
-        decoderCell.expressLectins(lectin_name_string, density_percentage)
+        decoderCell.number = i
+        decoderCell.coordinates = np.array(self.stream.coordinates(self.size))
+        decoderCell.expressLectins(lectin_name_string, density_percentage, self.stream)
+
+
+## Subclass of Well storing all particles as a struct of arrays instead of Python objects. The positions of all Beads
+# and all DecoderCells are kept in one integer array of shape (n, 3) each, while Glycans, Lectins and densities are
+# stored as parallel arrays. Glycans and Lectins are encoded as integers indexing \c glycan_names / \c glycan_types and
+# \c lectin_names, respectively. This allows Simulation to move all particles of one kind with a handful of vectorized
+# NumPy operations. Coordinates are stored in the smallest integer type holding the Well's size (int16 up to 32766 pt,
+# which covers the full-scale Well of 600 pt * 600 pt * 420 pt), codes as int16 and densities as float32.
+#
+# For ensembles of independent replicates of the same Well, all arrays get an additional leading replicate axis, i. e.
+# positions are of shape (replicates, n, 3) and codes and densities of shape (replicates, n).
+#
+# \param[in] x, y, z    Size of the Well.
+# \param[in] n_beads    Number of Beads.
+# \param[in] n_cells    Number of Cells.
+# \param[in] replicates Number of replicates (optional). If None, the arrays have no replicate axis.
+# \param     chunk_size Maximum number of particles processed at once (None: all at once). Limits the size of
+#                       temporary arrays for very large Wells.
+class Well_vectorized(Well):
+    ## The six possible steps of the random walk. Row \c i is the move chosen by drawing \c i.
+    moves = np.array([(0, 0, 1), (0, 1, 0), (1, 0, 0), (0, 0, -1), (0, -1, 0), (-1, 0, 0)], dtype=np.int8)
+    ## Displacement tables of \c leapTable, by number of steps.
+    leap_tables = {}
+
+    def __init__(self, x, y, z, n_beads, n_cells, replicates=None):
+        super().__init__(x, y, z)
+        self.size = np.array([x, y, z])
+        coordinate_type = np.int16 if max(x, y, z) < np.iinfo(np.int16).max else np.int32
+        leading = () if replicates is None else (replicates,)
+        self.replicates = replicates
+        self.chunk_size = None
+        self.bead_positions = np.zeros(leading + (n_beads, 3), dtype=coordinate_type)
+        self.bead_glycans = np.zeros(leading + (n_beads,), dtype=np.int16)
+        self.bead_densities = np.zeros(leading + (n_beads,), dtype=np.float32)
+        self.cell_positions = np.zeros(leading + (n_cells, 3), dtype=coordinate_type)
+        self.cell_lectins = np.zeros(leading + (n_cells,), dtype=np.int16)
+        self.cell_densities = np.zeros(leading + (n_cells,), dtype=np.float32)
+        self.glycan_names = []
+        self.glycan_types = []
+        self.lectin_names = []
+
+    ## Objects of class Bead for the Beads in the arrays, created only when accessed (see ParticleView).
+    @property
+    def beads(self):
+        return ParticleView(self, Bead)
+
+    ## Objects of class DecoderCell for the DecoderCells in the arrays, created only when accessed (see ParticleView).
+    @property
+    def decoderCells(self):
+        return ParticleView(self, DecoderCell)
+
+    ## Returns the integer code of a Glycan, i. e. its index in \c glycan_names and \c glycan_types. Unknown Glycans are
+    # appended to both lists.
+    #
+    # \param[in] glycan Object of class Glycan.
+    def glycanCode(self, glycan):
+        for i in range(len(self.glycan_names)):
+            if self.glycan_names[i] == glycan.name and self.glycan_types[i] == glycan.type:
+                return i
+        self.glycan_names.append(glycan.name)
+        self.glycan_types.append(glycan.type)
+        return len(self.glycan_names) - 1
+
+    ## Returns the integer code of a Lectin, i. e. its index in \c lectin_names. Unknown Lectins are appended.
+    #
+    # \param[in] lectin Object of class Lectin.
+    def lectinCode(self, lectin):
+        if lectin.name not in self.lectin_names:
+            self.lectin_names.append(lectin.name)
+        return self.lectin_names.index(lectin.name)
+
+    ## Method to add a Bead to the bead arrays. Coordinates of the Bead are randomly chosen between 0 and size of the
+    # Well in the respective dimension. The Bead object itself is only used to attach the Glycan and is not stored.
+    #
+    # \param[in] i                  Row in the arrays where the Bead will be added.
+    # \param[in] bead               Object of class Bead to be added.
+    # \param[in] glycan_name_string see documentation for class Glycan
+    # \param[in] glycan_type_string see documentation for class Glycan
+    # \param[in] density_percentage see documentation for class Glycan
+    def addBead(self, i, bead, glycan_name_string, glycan_type_string, density_percentage):
+        bead.attachGlycans(glycan_name_string, glycan_type_string, density_percentage, self.stream)
+        self.bead_positions[i] = self.stream.coordinates(self.size)
+        self.bead_glycans[i] = self.glycanCode(bead.glycan)
+        self.bead_densities[i] = bead.glycan_density
+
+    ## Method to add a DecoderCell to the cell arrays. Coordinates of the DecoderCell are randomly chosen between 0 and
+    # size of the Well in the respective dimension. The DecoderCell object itself is not stored.
+    #
+    # \param[in] i                  Row in the arrays where the DecoderCell will be added.
+    # \param[in] decoderCell        Object of class DecoderCell to be added.
+    # \param[in] lectin_name_string see documentation for class Lectin
+    # \param[in] density_percentage see documentation for class Lectin
+    def addDecoderCell(self, i, decoderCell, lectin_name_string, density_percentage):
+        decoderCell.expressLectins(lectin_name_string, density_percentage, self.stream)
+        self.cell_positions[i] = self.stream.coordinates(self.size)
+        self.cell_lectins[i] = self.lectinCode(decoderCell.lectin)
+        self.cell_densities[i] = decoderCell.lectin_density
+
+    ## Bulk counterpart of \c addBead and \c addDecoderCell. Fills all rows of the bead and cell arrays with one
+    # vectorized draw each, without creating objects of the classes Bead, DecoderCell, Glycan, or Lectin. Densities are
+    # clamped to 0--100 \% like in \c attachGlycans and \c expressLectins, but the warning is printed only once.
+    #
+    # \param[in] glycan_names_list see documentation for class Glycan
+    # \param[in] glycan_types_list see documentation for class Glycan
+    # \param[in] glycan_density    see documentation for class Glycan
+    # \param[in] lectin_list       see documentation for class Lectin
+    # \param[in] lectin_density    see documentation for class Lectin
+    # \param[in] rng               NumPy random Generator used to draw positions, Glycans, and Lectins. For Wells with
+    #                              replicates, a list containing one Generator per replicate.
+    def populate(self, glycan_names_list, glycan_types_list, glycan_density, lectin_list, lectin_density, rng):
+        if len(glycan_names_list) != len(glycan_types_list):
+            sys.exit("List of Glycan names and types don't have the same number of entries. Program terminated!")
+        glycan_codes = np.array([self.glycanCode(Glycan.intern(name, type)) for name, type in zip(glycan_names_list, glycan_types_list)], dtype=np.int16)
+        lectin_codes = np.array([self.lectinCode(Lectin.intern(name)) for name in lectin_list], dtype=np.int16)
+        n_beads, n_cells = self.bead_glycans.shape[-1], self.cell_lectins.shape[-1]
+        streams = [rng] if self.replicates is None else rng
+        replicates = self.replicates or 1
+        for r, generator in enumerate(streams):
+            self.bead_positions.reshape(replicates, n_beads, 3)[r] = generator.integers(0, self.size + 1, (n_beads, 3))
+            self.bead_glycans.reshape(replicates, n_beads)[r] = glycan_codes[generator.integers(0, len(glycan_codes), n_beads)]
+            self.cell_positions.reshape(replicates, n_cells, 3)[r] = generator.integers(0, self.size + 1, (n_cells, 3))
+            self.cell_lectins.reshape(replicates, n_cells)[r] = lectin_codes[generator.integers(0, len(lectin_codes), n_cells)]
+        self.bead_densities[:] = self.clampDensity(glycan_density)
+        self.cell_densities[:] = self.clampDensity(lectin_density)
+
+    ## Clamps a density to 0--100 \% and prints the same warnings as \c attachGlycans and \c expressLectins.
+    #
+    # \param[in] density_percentage Density of Glycan or Lectin (0--100 \%).
+    @staticmethod
+    def clampDensity(density_percentage):
+        if density_percentage > 100:
+            print("Given density_percentage higher than 100%! Value was set to 100%")
+            return 100
+        elif density_percentage < 0:
+            print("Given density_percentage lower than zero! Value was set to 0%")
+            return 0
+        return density_percentage
+
+    ## Vectorized counterpart of \c borderControl. Every particle takes one of the six steps of the random walk. If a
+    # step would leave the Well, it is reversed so the particle bounces back from the Well's border. The positions are
+    # updated in place, in portions of \c chunk_size particles if set.
+    #
+    # \param[in] positions Array of shape (n, 3) with the positions of the particles to move.
+    # \param[in] rng       NumPy random Generator used to draw the steps.
+    # \param[in] choices   Array of n steps (0--5) drawn beforehand (optional). If given, \c rng is not used.
+    # \param[in] bounds    Array of shape (n, 3) with the size of the Well of every particle (optional, default: \c size),
+    #                      used for the Wells of a Plate.
+    # \param[out] reflections Number of steps reversed at the borders
+    def randomWalk(self, positions, rng, choices=None, bounds=None):
+        chunk_size = self.chunk_size or max(len(positions), 1)
+        reflections = 0
+        for start in range(0, len(positions), chunk_size):
+            chunk = positions[start:start + chunk_size]
+            if choices is None:
+                steps = self.moves[rng.integers(0, 6, len(chunk))]
+            else:
+                steps = self.moves[choices[start:start + chunk_size]]
+            new_positions = chunk + steps
+            outside = (new_positions < 0) | (new_positions > (self.size if bounds is None else bounds[start:start + chunk_size]))
+            steps[outside] = -steps[outside]
+            chunk += steps
+            reflections += np.count_nonzero(outside)
+        return reflections
+
+    ## Returns the distribution of the net displacement of \c steps steps of the free random walk: the displacements
+    # with nonzero probability (array of shape (m, 3)) and their cumulative probabilities. Tables are computed once
+    # per number of steps.
+    #
+    # \param[in] steps Number of steps
+    @staticmethod
+    def leapTable(steps):
+        if steps not in Well_vectorized.leap_tables:
+            probabilities = np.zeros((2 * steps + 1,) * 3)
+            probabilities[steps, steps, steps] = 1.0
+            for _ in range(steps):
+                probabilities = sum(np.roll(probabilities, shift, axis) for shift in (-1, 1) for axis in range(3)) / 6
+            displacements = np.argwhere(probabilities > 0)
+            cumulative = np.cumsum(probabilities[tuple(displacements.T)])
+            Well_vectorized.leap_tables[steps] = (displacements - steps, cumulative / cumulative[-1])
+        return Well_vectorized.leap_tables[steps]
+
+    ## Moves the particles at \c positions by \c steps steps of the random walk at once. The net displacement is drawn
+    # from the table of \c leapTable. The reflection at the borders is exact: the random walk reflected at 0 and size
+    # is the free random walk folded into 0..size.
+    #
+    # \param[in] positions Array of positions (changed in place)
+    # \param[in] steps     Number of steps
+    # \param[in] rng       NumPy random Generator
+    def leapWalk(self, positions, steps, rng):
+        displacements, cumulative = self.leapTable(steps)
+        draws = np.searchsorted(cumulative, rng.random(len(positions)), side="right")
+        period = np.maximum(2 * self.size.astype(np.int64), 1)
+        folded = (positions + displacements[np.minimum(draws, len(cumulative) - 1)]) % period
+        positions[...] = np.where(folded > self.size, period - folded, folded)
+
+    ## Returns which DecoderCells and Beads have a particle of the other kind within Manhattan distance \c radius. The
+    # Beads are sorted by blocks of (radius + 1)^3 voxels, so all candidates of a DecoderCell are found in its block
+    # and the 26 neighbouring blocks; their exact distances are then compared with \c radius. As the blocks are far
+    # fewer than the voxels, the start of every block in the sorted Beads is kept in a dense table. Neighbouring blocks
+    # along z are adjacent in the sorting, so every DecoderCell needs 9 ranges of Beads.
+    #
+    # \param[in]  radius     Manhattan distance
+    # \param[out] near_cells Boolean array, one entry per DecoderCell
+    # \param[out] near_beads Boolean array, one entry per Bead
+    def closeParticles(self, radius):
+        side = radius + 1
+        shape = self.size.astype(np.int64) // side + 3 # blocks are shifted by one to keep all neighbours inside
+        blocks = (self.bead_positions // side + 1).astype(np.int64)
+        keys = (blocks[:, 0] * shape[1] + blocks[:, 1]) * shape[2] + blocks[:, 2]
+        order = np.argsort(keys)
+        counts = np.bincount(keys, minlength=np.prod(shape))
+        starts = np.concatenate(([0], np.cumsum(counts))) # sorted Beads of block j: starts[j] to starts[j + 1]
+        bead_positions = self.bead_positions[order].astype(np.int32)
+        blocks = (self.cell_positions // side + 1).astype(np.int64)
+        keys = (blocks[:, 0] * shape[1] + blocks[:, 1]) * shape[2] + blocks[:, 2]
+        near_cells = np.zeros(len(self.cell_positions), dtype=bool)
+        near_beads = np.zeros(len(self.bead_positions), dtype=bool)
+        for dx in (-1, 0, 1):
+            for dy in (-1, 0, 1):
+                shifted = keys + (dx * shape[1] + dy) * shape[2]
+                first = starts[shifted - 1]
+                found = starts[shifted + 2] - first
+                cells = np.repeat(np.arange(len(keys)), found)
+                beads = np.arange(len(cells)) + np.repeat(first - (np.cumsum(found) - found), found)
+                close = np.abs(self.cell_positions[cells].astype(np.int32) - bead_positions[beads]).sum(axis=1) <= radius
+                near_cells[cells[close]] = True
+                near_beads[order[beads[close]]] = True
+        return near_cells, near_beads
+
+
+## ParticleView presents the Beads or DecoderCells of a Well_vectorized as a sequence of objects of class Bead or
+# DecoderCell. Objects are created on access only, so Wells built in bulk carry no per-particle objects. The coordinates
+# of a created object are a view of the respective row of the position array, i. e. they follow the particle when it
+# moves. Glycan/Lectin and density are copies. Only Wells without replicate axis are supported.
+#
+# \param[in] well       Object of class Well_vectorized
+# \param[in] sphere_type Bead or DecoderCell
+class ParticleView:
+    def __init__(self, well, sphere_type):
+        self.well = well
+        self.sphere_type = sphere_type
+
+    def __len__(self):
+        return len(self.well.bead_positions if self.sphere_type is Bead else self.well.cell_positions)
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(len(self)))]
+        if i < 0:
+            i += len(self)
+        well = self.well
+        if self.sphere_type is Bead:
+            bead = Bead()
+            bead.number = i
+            bead.coordinates = well.bead_positions[i]
+            code = well.bead_glycans[i]
+            bead.glycan = Glycan.intern(well.glycan_names[code], well.glycan_types[code])
+            bead.glycan_density = float(well.bead_densities[i])
+            return bead
+        decoderCell = DecoderCell()
+        decoderCell.number = i
+        decoderCell.coordinates = well.cell_positions[i]
+        decoderCell.lectin = Lectin.intern(well.lectin_names[well.cell_lectins[i]])
+        decoderCell.lectin_density = float(well.cell_densities[i])
+        return decoderCell
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+
+## VoxelIndex is a co-location index over the lattice of a Well. Every position is linearized into a single integer
+# key (its voxel). Building the index sorts the keys of one set of particles (usually the Beads), so that all particles
+# sharing a voxel form one contiguous run. Queries with another set of particles (usually the DecoderCells) then find
+# all particles in the same voxel by binary search, i. e. in O((n + m) log n) instead of O(n m) comparisons. Any number
+# of particles may share one voxel. Optionally, particles can be assigned to groups (e. g. replicates) which are kept
+# apart, i. e. particles only meet particles of the same group.
+#
+# \param[in] size Size of the Well. Valid coordinates range from 0 to size in every dimension.
+class VoxelIndex:
+    def __init__(self, size):
+        self.shape = np.asarray(size, dtype=np.int64) + 1
+        self.order = np.empty(0, dtype=np.int64)
+        self.sorted_keys = np.empty(0, dtype=np.int64)
+
+    ## Returns the linearized voxel keys of the given positions.
+    #
+    # \param[in] positions Array of shape (n, 3) or list of three coordinates.
+    # \param[in] groups    Array of n group numbers (optional).
+    def keys(self, positions, groups=None):
+        positions = np.asarray(positions, dtype=np.int64)
+        keys = (positions[..., 0] * self.shape[1] + positions[..., 1]) * self.shape[2] + positions[..., 2]
+        if groups is not None:
+            keys += np.asarray(groups, dtype=np.int64) * np.prod(self.shape)
+        return keys
+
+    ## (Re)builds the index for the given positions. Must be called whenever the indexed particles have moved.
+    #
+    # \param[in] positions Array of shape (n, 3) with the positions of the particles to be indexed.
+    # \param[in] groups    Array of n group numbers (optional).
+    def build(self, positions, groups=None):
+        keys = self.keys(positions, groups)
+        self.order = np.argsort(keys, kind="stable")
+        self.sorted_keys = keys[self.order]
+
+    ## Returns the indices of all indexed particles at the given position.
+    #
+    # \param[in] coordinates List or array containing the three values for x, y, and z.
+    def lookup(self, coordinates):
+        key = self.keys(coordinates)
+        left = np.searchsorted(self.sorted_keys, key, side="left")
+        right = np.searchsorted(self.sorted_keys, key, side="right")
+        return self.order[left:right]
+
+    ## Returns all pairs of query particles and indexed particles sharing a voxel. Pairs are sorted by query index
+    # first and by index of the indexed particle second.
+    #
+    # \param[in]  positions Array of shape (m, 3) with the positions of the query particles.
+    # \param[in]  groups    Array of m group numbers (optional).
+    # \param[out] queries   Indices of the query particles of all pairs.
+    # \param[out] matches   Indices of the indexed particles of all pairs.
+    def query(self, positions, groups=None):
+        keys = self.keys(positions, groups)
+        left = np.searchsorted(self.sorted_keys, keys, side="left")
+        counts = np.searchsorted(self.sorted_keys, keys, side="right") - left
+        queries = np.repeat(np.arange(len(keys)), counts)
+        offsets = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+        matches = self.order[np.repeat(left, counts) + offsets]
+        return queries, matches
+
+
+## OccupancyGrid keeps the number of Beads in every voxel of the Well in a dense array, so whether a DecoderCell meets
+# a Bead is a single array read. It can replace a VoxelIndex (same \c build and \c query, no groups): when \c build is
+# called again with the same number of Beads, only the counts of Beads which changed their voxel are updated, in
+# O(moved) instead of sorting all Beads. The Beads of the voxels hit by a query are collected by marking these voxels
+# and reading the marks of all Beads. \c within finds all Beads within a radius.
+#
+# The grid only pays off if few Beads change their voxel between two builds (e. g. 1% of the Beads: about 3 times
+# faster than a VoxelIndex at full scale). In \c simulate every particle moves in every step, so a VoxelIndex is
+# faster there and is used instead.
+#
+# Dense arrays need memory proportional to the volume of the Well; use \c create to get a SparseOccupancyGrid for
+# large Wells.
+#
+# \param[in] size Array with the dimensions x, y, z of the Well.
+class OccupancyGrid(VoxelIndex):
+    def __init__(self, size):
+        super().__init__(size)
+        self.bead_keys = None
+        self.allocate(int(np.prod(self.shape)))
+
+    ## Returns an OccupancyGrid if its arrays need at most \c max_bytes bytes, otherwise a SparseOccupancyGrid.
+    #
+    # \param[in] size      Array with the dimensions x, y, z of the Well.
+    # \param[in] max_bytes Memory limit of the dense grid.
+    @staticmethod
+    def create(size, max_bytes=64 * 2**20):
+        if 5 * np.prod(np.asarray(size, dtype=np.int64) + 1) <= max_bytes:
+            return OccupancyGrid(size)
+        return SparseOccupancyGrid(size)
+
+    ## Allocates the counts and marks of \c slots voxels. An additional last slot stands for all voxels without Beads.
+    def allocate(self, slots):
+        self.counts = np.zeros(slots + 1, dtype=np.int32)
+        self.marks = np.zeros(slots + 1, dtype=bool)
+
+    ## Returns the slots of the given voxel keys in \c counts. Voxels are their own slots in the dense grid.
+    #
+    # \param[in] keys   Array of voxel keys.
+    # \param[in] insert Create slots for unknown voxels (only relevant for SparseOccupancyGrid).
+    def slots(self, keys, insert=False):
+        return keys
+
+    ## Counts all Beads (first call, or changed number of Beads) or updates the counts of the Beads which moved to
+    # another voxel since the last call. Neither touches the voxels without Beads, so the cost doesn't grow with the
+    # volume of the Well.
+    #
+    # \param[in] positions Array of shape (n, 3) with the positions of the Beads.
+    # \param[in] groups    Not supported.
+    def build(self, positions, groups=None):
+        if groups is not None:
+            sys.exit("OccupancyGrid does not support groups! Please use VoxelIndex.")
+        keys = self.keys(positions)
+        if self.bead_keys is None or len(keys) != len(self.bead_keys):
+            if self.bead_keys is not None:
+                np.subtract.at(self.counts, self.bead_slots, 1)
+            self.bead_slots = self.slots(keys, insert=True)
+            np.add.at(self.counts, self.bead_slots, 1)
+        else:
+            moved = np.flatnonzero(keys != self.bead_keys)
+            np.subtract.at(self.counts, self.bead_slots[moved], 1)
+            self.bead_slots[moved] = self.slots(keys[moved], insert=True)
+            np.add.at(self.counts, self.bead_slots[moved], 1)
+        self.bead_keys = keys
+
+    ## Returns the number of Beads at the given positions.
+    #
+    # \param[in] positions Array of shape (m, 3) or list of three coordinates.
+    def count(self, positions):
+        return self.counts[self.slots(self.keys(positions))]
+
+    ## Returns the indices of all Beads at the given position.
+    #
+    # \param[in] coordinates List or array containing the three values for x, y, and z.
+    def lookup(self, coordinates):
+        return np.flatnonzero(self.bead_keys == self.keys(coordinates))
+
+    ## Returns all pairs of query positions and Beads in the voxels given by \c keys, sorted by query index first and
+    # by Bead second.
+    #
+    # \param[in]  queries Array with the query index of every key.
+    # \param[in]  keys    Array of voxel keys.
+    # \param[out] queries Query indices of all pairs.
+    # \param[out] beads   Bead indices of all pairs.
+    def pairs(self, queries, keys):
+        slots = self.slots(keys)
+        found = self.counts[slots]
+        hits = np.flatnonzero(found)
+        self.marks[slots[hits]] = True
+        candidates = np.flatnonzero(self.marks[self.bead_slots])
+        self.marks[slots[hits]] = False
+        order = np.argsort(self.bead_keys[candidates], kind="stable")
+        sorted_keys = self.bead_keys[candidates][order]
+        found = found[hits]
+        left = np.repeat(np.searchsorted(sorted_keys, keys[hits]), found)
+        offsets = np.arange(len(left)) - np.repeat(np.cumsum(found) - found, found)
+        return np.repeat(queries[hits], found), candidates[order[left + offsets]]
+
+    ## Returns all pairs of query particles and Beads sharing a voxel, sorted like \c VoxelIndex.query.
+    #
+    # \param[in]  positions Array of shape (m, 3) with the positions of the query particles.
+    # \param[in]  groups    Not supported.
+    # \param[out] queries   Indices of the query particles of all pairs.
+    # \param[out] matches   Indices of the Beads of all pairs.
+    def query(self, positions, groups=None):
+        if groups is not None:
+            sys.exit("OccupancyGrid does not support groups! Please use VoxelIndex.")
+        return self.pairs(np.arange(len(positions)), self.keys(positions))
+
+    ## Returns all pairs of query positions and Beads whose Euclidean distance is at most \c radius voxels, sorted by
+    # query index first and by Bead second.
+    #
+    # \param[in]  positions Array of shape (m, 3) with the query positions.
+    # \param[in]  radius    Radius in voxels.
+    # \param[out] queries   Indices of the query positions of all pairs.
+    # \param[out] beads     Indices of the Beads of all pairs.
+    def within(self, positions, radius):
+        r = int(radius)
+        offsets = np.array([(dx, dy, dz) for dx in range(-r, r + 1) for dy in range(-r, r + 1) for dz in range(-r, r + 1)
+                            if dx * dx + dy * dy + dz * dz <= radius * radius], dtype=np.int64)
+        voxels = np.asarray(positions, dtype=np.int64).reshape(-1, 1, 3) + offsets
+        inside = np.all((voxels >= 0) & (voxels < self.shape), axis=2)
+        queries, k = np.nonzero(inside)
+        queries, beads = self.pairs(queries, self.keys(voxels[queries, k]))
+        order = np.lexsort((beads, queries))
+        return queries[order], beads[order]
+
+
+## SparseOccupancyGrid is an OccupancyGrid whose counts are kept in a hash table of the occupied voxels (open
+# addressing with linear probing), so memory is proportional to the number of Beads instead of the volume of the Well.
+# Voxels left by all their Beads keep their slot until the table is rebuilt, which happens when it is half full.
+#
+# \param[in] size Array with the dimensions x, y, z of the Well.
+class SparseOccupancyGrid(OccupancyGrid):
+    def __init__(self, size):
+        VoxelIndex.__init__(self, size)
+        self.bead_keys = None
+        self.allocate(1024)
+
+    def allocate(self, slots):
+        super().allocate(slots)
+        self.table = np.full(slots, -1, dtype=np.int64) # voxel key of every slot, -1: empty
+        self.used = 0
+
+    def slots(self, keys, insert=False):
+        keys = np.asarray(keys, dtype=np.int64)
+        mask = len(self.table) - 1
+        result = np.full(keys.shape, len(self.table)) # slot of voxels without Beads
+        pending = np.arange(keys.size)
+        flat = keys.reshape(-1)
+        probe = (flat * 2654435761) & mask
+        while len(pending):
+            stored = self.table[probe]
+            found = stored == flat[pending]
+            empty = stored == -1
+            if insert and empty.any(): # first key for an empty slot claims it, the others probe it again
+                claims = np.flatnonzero(empty)
+                slots, first = np.unique(probe[claims], return_index=True)
+                self.table[slots] = flat[pending[claims[first]]]
+                self.used += len(slots)
+                found[claims[first]] = True
+            result.reshape(-1)[pending[found]] = probe[found]
+            advance = ~found & ~empty
+            keep = advance | (empty & insert & ~found)
+            probe[advance] = (probe[advance] + 1) & mask
+            pending, probe = pending[keep], probe[keep]
+        return result
+
+    def build(self, positions, groups=None):
+        keys = self.keys(positions)
+        if self.bead_keys is None or len(keys) != len(self.bead_keys) or 2 * (self.used + len(keys)) > len(self.table):
+            slots = 1024 # new number of Beads or too many slots in use: rebuild the table
+            while slots < 4 * len(keys):
+                slots *= 2
+            self.allocate(slots)
+            self.bead_keys = None
+        super().build(positions, groups)
+
+
+## Recorder streams the trajectory of a simulation with a Well_vectorized to disk and writes checkpoints from which an
+# interrupted run can be resumed. Positions of Beads and DecoderCells of every \c every-th step are kept in a buffer
+# of \c buffer_frames frames and then written to the memory-mapped files \c beads.npy and \c cells.npy of shape
+# (frames, n, 3). Binding events are written in chunks (\c events_000000.npy, ...) whenever the buffer is flushed.
+# Every \c checkpoint_every steps, \c checkpoint.npz is written containing the step number, all arrays of the Well,
+# the state of the random Generator and the number of event chunks, so RAM usage is bounded by the buffer size. The
+# Simulation passes the events of every step to \c feed, so they needn't be stored in the Simulation as well
+# (\c store_events=False).
+#
+# \param[in] directory        Directory of the recording. Created if necessary.
+# \param[in] every            Record positions of every k-th step.
+# \param[in] buffer_frames    Number of frames held in RAM before they are written to disk.
+# \param[in] checkpoint_every Number of steps between two checkpoints.
+class Recorder:
+    def __init__(self, directory, every=1, buffer_frames=16, checkpoint_every=16):
+        self.directory = directory
+        self.every = every
+        self.buffer_frames = buffer_frames
+        self.checkpoint_every = checkpoint_every
+        os.makedirs(directory, exist_ok=True)
+
+    ## Returns the path of a file of the recording.
+    def path(self, name):
+        return os.path.join(self.directory, name)
+
+    ## Prepares the recording for a run of \c steps steps. If a checkpoint exists, the Well and the random Generator are
+    # restored from it and event chunks written after the checkpoint are discarded. The events recorded before are read
+    # chunk by chunk and fed to the reducers of the Simulation (see Simulation.replay); they are only kept in its
+    # CytokineBuffer if \c store_events is set. Returns the number of the first step to be simulated.
+    #
+    # \param[in] simulation Object of class Simulation
+    # \param[in] well       Object of class Well_vectorized
+    # \param[in] steps      Total number of steps of the run
+    def start(self, simulation, well, steps):
+        frames = steps // self.every
+        first = 0
+        self.steps = steps
+        self.chunks = 0
+        if os.path.exists(self.path("checkpoint.npz")):
+            simulation.cytokines = CytokineBuffer()
+            with np.load(self.path("checkpoint.npz"), allow_pickle=True) as checkpoint:
+                for name in ("bead_positions", "bead_glycans", "bead_densities", "cell_positions", "cell_lectins", "cell_densities"):
+                    setattr(well, name, checkpoint[name].copy())
+                well.glycan_names = checkpoint["glycan_names"].tolist()
+                well.glycan_types = checkpoint["glycan_types"].tolist()
+                well.lectin_names = checkpoint["lectin_names"].tolist()
+                simulation.cytokines.names = checkpoint["cytokine_names"].tolist()
+                simulation.rng.bit_generator.state = checkpoint["rng_state"].item()
+                first = int(checkpoint["step"]) + 1
+                self.chunks = int(checkpoint["chunks"])
+            for chunk in range(self.chunks):
+                events = np.load(self.path("events_%06d.npy" % chunk), mmap_mode="r")
+                if simulation.store_events:
+                    simulation.cytokines.extendEvents(events)
+                simulation.replay(events)
+                del events
+            mode = "r+"
+        else:
+            mode = "w+"
+        chunk = self.chunks
+        while os.path.exists(self.path("events_%06d.npy" % chunk)):
+            os.remove(self.path("events_%06d.npy" % chunk))
+            chunk += 1
+        self.beads = np.lib.format.open_memmap(self.path("beads.npy"), mode=mode, dtype=well.bead_positions.dtype, shape=(frames,) + well.bead_positions.shape)
+        self.cells = np.lib.format.open_memmap(self.path("cells.npy"), mode=mode, dtype=well.cell_positions.dtype, shape=(frames,) + well.cell_positions.shape)
+        self.bead_buffer = np.empty((self.buffer_frames,) + well.bead_positions.shape, dtype=well.bead_positions.dtype)
+        self.cell_buffer = np.empty((self.buffer_frames,) + well.cell_positions.shape, dtype=well.cell_positions.dtype)
+        self.buffered = 0
+        self.first_frame = first // self.every
+        self.events = CytokineBuffer()
+        return first
+
+    ## Buffers the Cytokines produced in step \c n until the next flush. Called by Simulation.record.
+    #
+    # \param[in] n         Step number
+    # \param[in] cells     Array with the numbers of the DecoderCells
+    # \param[in] beads     Array with the numbers of the Beads
+    # \param[in] codes     Array with the codes of the Cytokines in the CytokineBuffer of the Simulation
+    # \param[in] positions Array of shape (n, 3) with the coordinates of production
+    def feed(self, n, cells, beads, codes, positions):
+        self.events.extend(n, cells, beads, codes, positions)
+
+    ## Records the positions after step n and writes a checkpoint if due. Called by Simulation after every step.
+    #
+    # \param[in] n          Step number
+    # \param[in] simulation Object of class Simulation
+    # \param[in] well       Object of class Well_vectorized
+    def record(self, n, simulation, well):
+        if (n + 1) % self.every == 0:
+            self.bead_buffer[self.buffered] = well.bead_positions
+            self.cell_buffer[self.buffered] = well.cell_positions
+            self.buffered += 1
+            if self.buffered == self.buffer_frames:
+                self.flush()
+        if (n + 1) % self.checkpoint_every == 0:
+            self.checkpoint(n, simulation, well)
+
+    ## Writes buffered frames and events to disk.
+    def flush(self):
+        frames = slice(self.first_frame, self.first_frame + self.buffered)
+        self.beads[frames] = self.bead_buffer[:self.buffered]
+        self.cells[frames] = self.cell_buffer[:self.buffered]
+        self.beads.flush()
+        self.cells.flush()
+        self.first_frame += self.buffered
+        self.buffered = 0
+        if len(self.events):
+            np.save(self.path("events_%06d.npy" % self.chunks), self.events.view())
+            self.chunks += 1
+            self.events.n = 0
+
+    ## Flushes all buffers and writes a checkpoint after step n. The checkpoint is written to a temporary file first
+    # and then renamed, so a crash never leaves a broken checkpoint behind.
+    def checkpoint(self, n, simulation, well):
+        self.flush()
+        with open(self.path("checkpoint.tmp.npz"), "wb") as f:
+            np.savez(f, step=n, chunks=self.chunks, rng_state=np.array(simulation.rng.bit_generator.state, dtype=object), # pickled: Philox state contains arrays
+                     bead_positions=well.bead_positions, bead_glycans=well.bead_glycans, bead_densities=well.bead_densities,
+                     cell_positions=well.cell_positions, cell_lectins=well.cell_lectins, cell_densities=well.cell_densities,
+                     glycan_names=np.array(well.glycan_names), glycan_types=np.array(well.glycan_types),
+                     lectin_names=np.array(well.lectin_names), cytokine_names=np.array(simulation.cytokines.names))
+        os.replace(self.path("checkpoint.tmp.npz"), self.path("checkpoint.npz"))
+
+    ## Finishes the recording by flushing all buffers and writing a final checkpoint.
+    def close(self, simulation, well):
+        self.checkpoint(self.steps - 1, simulation, well)
+        del self.beads, self.cells
+
+    ## Opens a recording for analysis. The trajectories are memory-mapped read-only, i. e. not loaded into RAM.
+    #
+    # \param[in]  directory Directory of the recording.
+    # \param[out] recording Dictionary with the trajectories \c beads and \c cells (arrays of shape (frames, n, 3))
+    #                       and the binding \c events as CytokineBuffer.
+    @staticmethod
+    def load(directory):
+        events = CytokineBuffer()
+        chunks = 0
+        if os.path.exists(os.path.join(directory, "checkpoint.npz")):
+            with np.load(os.path.join(directory, "checkpoint.npz")) as checkpoint:
+                events.names = checkpoint["cytokine_names"].tolist()
+                chunks = int(checkpoint["chunks"])
+        for chunk in range(chunks):
+            events.extendEvents(np.load(os.path.join(directory, "events_%06d.npy" % chunk), mmap_mode="r"))
+        return {"beads": np.load(os.path.join(directory, "beads.npy"), mmap_mode="r"),
+                "cells": np.load(os.path.join(directory, "cells.npy"), mmap_mode="r"), "events": events}
+
+
+## Engine is the superclass of the backends performing the step of a simulation with a Well_vectorized: moving all
+# Beads and DecoderCells and finding all pairs of DecoderCells and Beads at the same position. The binding itself is
+# left to Simulation. Use \c Engine.create to get a backend by name.
+class Engine:
+    ## Profiler measuring the phases of \c step (optional, set by Simulation).
+    profiler = None
+
+    ## Returns a new backend. "numpy" is Engine_numpy, "numba" is Engine_numba, and "auto" chooses Engine_numba if Numba
+    # is installed. If Numba is requested but not installed, Engine_numpy is used instead. Numba is only imported if
+    # Engine_numba is chosen.
+    #
+    # \param[in] backend Name of the backend ("numpy", "numba", or "auto").
+    @staticmethod
+    def create(backend):
+        if backend == "numpy":
+            return Engine_numpy()
+        if backend in ("numba", "auto"):
+            if Engine.numbaInstalled():
+                return Engine_numba()
+            if backend == "numba":
+                print("Numba is not installed! Falling back to NumPy engine.")
+            return Engine_numpy()
+        sys.exit("Unknown backend! Please choose numpy, numba, or auto.")
+
+    ## Returns whether Numba is installed, without importing it.
+    @staticmethod
+    def numbaInstalled():
+        return importlib.util.find_spec("numba") is not None
+
+    ## Prepares the backend for a Well (e. g. allocates buffers). Called once before the first step.
+    def prepare(self, well):
+        pass
+
+    ## Performs one step: moves all particles and returns the pairs of co-located DecoderCells and Beads, sorted by
+    # DecoderCell first and Bead second.
+    #
+    # \param[in]  well  Object of class Well_vectorized
+    # \param[in]  rng   NumPy random Generator
+    # \param[out] cells Numbers of the DecoderCells of all pairs
+    # \param[out] beads Numbers of the Beads of all pairs
+    def step(self, well, rng):
+        raise NotImplementedError
+
+
+## Backend using NumPy only: \c Well_vectorized.randomWalk for the moves and a VoxelIndex for the contacts, both
+# in portions of \c chunk_size particles if set.
+class Engine_numpy(Engine):
+    def prepare(self, well):
+        self.index = VoxelIndex(well.size)
+
+    def step(self, well, rng):
+        reflections = well.randomWalk(well.bead_positions, rng) + well.randomWalk(well.cell_positions, rng)
+        if self.profiler is not None:
+            self.profiler.lap("move")
+            self.profiler.count("reflections", reflections)
+        self.index.build(well.bead_positions)
+        chunk_size = well.chunk_size or max(len(well.cell_positions), 1)
+        pairs = []
+        for start in range(0, max(len(well.cell_positions), 1), chunk_size): # at least one (empty) query
+            cells, beads = self.index.query(well.cell_positions[start:start + chunk_size])
+            pairs.append((cells + start, beads))
+        if len(pairs) == 1:
+            cells, beads = pairs[0]
+        else:
+            cells, beads = np.concatenate([p[0] for p in pairs]), np.concatenate([p[1] for p in pairs])
+        if self.profiler is not None:
+            self.profiler.lap("contacts")
+            self.profiler.count("lookups", len(well.cell_positions))
+            self.profiler.count("colocations", len(cells))
+        return cells, beads
+
+
+## Backend with kernels compiled by Numba (nopython mode, parallel loops). The move of the Beads and the border
+# reflection are done in one pass, followed by filling an open-addressing hash table of the Bead voxels (chains of
+# Beads per voxel in ascending order). The move of the DecoderCells is fused with counting their co-located Beads;
+# a last pass writes the pairs. All buffers, including those for the random numbers, are allocated in \c prepare and
+# reused in every step; only the pair buffers grow if a step produces more pairs than ever before. Numba is imported
+# and the kernels are defined when the first Engine_numba is created (see \c compile), so importing this module
+# doesn't import Numba.
+class Engine_numba(Engine):
+    ## Whether the kernels are defined.
+    compiled = False
+
+    def __init__(self):
+        self.compile()
+
+    ## Imports Numba and defines the kernels as static methods of the class (once).
+    @classmethod
+    def compile(cls):
+        if cls.compiled:
+            return
+        import numba
+
+        ## Returns the first Bead in the voxel with the given key in the hash table, or -1. A function of its own,
+        # since kernels compiled by Numba can't call methods of a class.
+        @numba.njit(cache=True)
+        def findKernel(key, mask, heads, slot_keys):
+            slot = (key * 2654435761) & mask
+            while heads[slot] != -1:
+                if slot_keys[slot] == key:
+                    return heads[slot]
+                slot = (slot + 1) & mask
+            return -1
+
+        ## Moves every particle according to its random number u (step int(6u), see Well_vectorized.moves) and
+        # reflects it at the Well's borders. Returns the number of reflected moves.
+        @numba.njit(parallel=True, cache=True)
+        def moveKernel(positions, draws, size):
+            reflections = 0
+            for i in numba.prange(positions.shape[0]):
+                c = int(draws[i] * 6.0)
+                axis = 2 - c % 3
+                sign = 1 if c < 3 else -1
+                p = positions[i, axis] + sign
+                if p < 0 or p > size[axis]:
+                    p = positions[i, axis] - sign
+                    reflections += 1
+                positions[i, axis] = p
+            return reflections
+
+        ## Inserts all Beads into the hash table. Beads are inserted in descending order, so every chain lists the
+        # Beads of a voxel in ascending order.
+        @numba.njit(cache=True)
+        def buildKernel(positions, shape, mask, heads, slot_keys, chain):
+            heads[:] = -1
+            for i in range(positions.shape[0] - 1, -1, -1):
+                key = (np.int64(positions[i, 0]) * shape[1] + positions[i, 1]) * shape[2] + positions[i, 2]
+                slot = (key * 2654435761) & mask
+                while heads[slot] != -1 and slot_keys[slot] != key:
+                    slot = (slot + 1) & mask
+                slot_keys[slot] = key
+                chain[i] = heads[slot]
+                heads[slot] = i
+
+        ## Moves every DecoderCell like \c moveKernel and counts the Beads in its new voxel. Returns the number of
+        # reflected moves.
+        @numba.njit(parallel=True, cache=True)
+        def moveCountKernel(positions, draws, size, shape, mask, heads, slot_keys, chain, counts):
+            reflections = 0
+            for k in numba.prange(positions.shape[0]):
+                c = int(draws[k] * 6.0)
+                axis = 2 - c % 3
+                sign = 1 if c < 3 else -1
+                p = positions[k, axis] + sign
+                if p < 0 or p > size[axis]:
+                    p = positions[k, axis] - sign
+                    reflections += 1
+                positions[k, axis] = p
+                key = (np.int64(positions[k, 0]) * shape[1] + positions[k, 1]) * shape[2] + positions[k, 2]
+                bead = findKernel(key, mask, heads, slot_keys)
+                count = 0
+                while bead != -1:
+                    count += 1
+                    bead = chain[bead]
+                counts[k] = count
+            return reflections
+
+        ## Writes the pairs of every DecoderCell from position ends[k] - counts[k] on.
+        @numba.njit(parallel=True, cache=True)
+        def fillKernel(positions, shape, mask, heads, slot_keys, chain, counts, ends, cells, beads):
+            for k in numba.prange(positions.shape[0]):
+                if counts[k] == 0:
+                    continue
+                key = (np.int64(positions[k, 0]) * shape[1] + positions[k, 1]) * shape[2] + positions[k, 2]
+                bead = findKernel(key, mask, heads, slot_keys)
+                j = ends[k] - counts[k]
+                while bead != -1:
+                    cells[j] = k
+                    beads[j] = bead
+                    j += 1
+                    bead = chain[bead]
+
+        for kernel in (moveKernel, buildKernel, moveCountKernel, fillKernel):
+            setattr(cls, kernel.__name__, staticmethod(kernel))
+        cls.compiled = True
+
+    def prepare(self, well):
+        n_beads, n_cells = len(well.bead_positions), len(well.cell_positions)
+        slots = 1 << max(int(2 * n_beads - 1).bit_length(), 1) # at least twice as many slots as Beads
+        self.shape = (well.size + 1).astype(np.int64)
+        self.size = well.size.astype(np.int64)
+        self.mask = slots - 1
+        self.heads = np.empty(slots, dtype=np.int64)
+        self.slot_keys = np.empty(slots, dtype=np.int64)
+        self.chain = np.empty(n_beads, dtype=np.int64)
+        self.bead_draws = np.empty(n_beads)
+        self.cell_draws = np.empty(n_cells)
+        self.counts = np.empty(n_cells, dtype=np.int64)
+        self.ends = np.empty(n_cells, dtype=np.int64)
+        self.cells = np.empty(max(n_cells, 1), dtype=np.int64)
+        self.beads = np.empty(max(n_cells, 1), dtype=np.int64)
+
+    def step(self, well, rng):
+        rng.random(out=self.bead_draws)
+        rng.random(out=self.cell_draws)
+        reflections = self.moveKernel(well.bead_positions, self.bead_draws, self.size)
+        if self.profiler is not None:
+            self.profiler.lap("move")
+        self.buildKernel(well.bead_positions, self.shape, self.mask, self.heads, self.slot_keys, self.chain)
+        reflections += self.moveCountKernel(well.cell_positions, self.cell_draws, self.size, self.shape, self.mask, self.heads, self.slot_keys, self.chain, self.counts)
+        np.cumsum(self.counts, out=self.ends)
+        total = int(self.ends[-1]) if len(self.ends) else 0
+        if total > len(self.cells):
+            self.cells = np.empty(2 * total, dtype=np.int64)
+            self.beads = np.empty(2 * total, dtype=np.int64)
+        self.fillKernel(well.cell_positions, self.shape, self.mask, self.heads, self.slot_keys, self.chain, self.counts, self.ends, self.cells, self.beads)
+        if self.profiler is not None:
+            self.profiler.lap("contacts")
+            self.profiler.count("reflections", reflections)
+            self.profiler.count("lookups", len(well.cell_positions))
+            self.profiler.count("colocations", total)
+        return self.cells[:total], self.beads[:total]
+
+
+## BindingTable is the cytokine dictionary compiled into integer-coded matrices, so that whole batches of encounters
+# can be resolved by fancy indexing. Glycan types index the rows and Lectins the columns of
+#   - \c cytokines:   array of shape (glycan types + 1, lectins + 1, k) with the codes (index in \c names) of the
+#                     Cytokines produced by a pair, padded with -1. A value of the dictionary may be a single Cytokine
+#                     name or a tuple of names, in which case a binding event produces all of them (k is the largest
+#                     number of Cytokines per pair).
+#   - \c probability: array of shape (glycan types + 1, lectins + 1) with the factor by which the multiplied densities
+#                     are scaled for a pair (1 for pairs in the dictionary, 0 otherwise). Entries may be changed after
+#                     compilation to model weaker binders.
+# The last row and column stand for Glycan types and Lectins missing from the dictionary, which never bind.
+#
+# \param[in] cytokine_dict Dictionary for binding specificity and cytokine expression (see class Simulation)
+class BindingTable:
+    def __init__(self, cytokine_dict):
+        self.glycan_types = list(cytokine_dict)
+        self.lectin_names = []
+        self.names = []
+        for lectins in cytokine_dict.values():
+            for lectin, cytokines in lectins.items():
+                if lectin not in self.lectin_names:
+                    self.lectin_names.append(lectin)
+                for name in self.cytokineTuple(cytokines):
+                    if name not in self.names:
+                        self.names.append(name)
+        depth = max([len(self.cytokineTuple(c)) for lectins in cytokine_dict.values() for c in lectins.values()] + [1])
+        self.cytokines = np.full((len(self.glycan_types) + 1, len(self.lectin_names) + 1, depth), -1, dtype=np.int16)
+        self.probability = np.zeros((len(self.glycan_types) + 1, len(self.lectin_names) + 1))
+        self.pairs = {}
+        for i, (glycan_type, lectins) in enumerate(cytokine_dict.items()):
+            for lectin, cytokines in lectins.items():
+                j = self.lectin_names.index(lectin)
+                names = self.cytokineTuple(cytokines)
+                self.cytokines[i, j, :len(names)] = [self.names.index(name) for name in names]
+                self.probability[i, j] = 1
+                self.pairs[(glycan_type, lectin)] = names
+
+    ## Returns the Cytokine names of a dictionary value as a tuple. A single name (as in ("IL-6"), which is a string) is
+    # wrapped into a tuple.
+    @staticmethod
+    def cytokineTuple(value):
+        return (value,) if isinstance(value, str) else tuple(value)
+
+    ## Ensures that the table contains all entered glycan and lectin types. Otherwise, the program terminates.
+    #
+    # \param[in] glycan_types_list see documentation for class Glycan
+    # \param[in] lectin_list       see documentation for class Lectin
+    def validate(self, glycan_types_list, lectin_list):
+        for glycan_type in glycan_types_list:
+            if glycan_type not in self.glycan_types:
+                sys.exit("Glycan Type not in Dictionary!")
+        for lectin in lectin_list:
+            if lectin not in self.lectin_names:
+                sys.exit("Lectin not in Dictionary!")
+
+    ## Returns the names of the Cytokines produced by a pair of Glycan type and Lectin (empty if they don't bind).
+    def lookup(self, glycan_type, lectin_name):
+        return self.pairs.get((glycan_type, lectin_name), ())
+
+    ## Returns the rows of the given Glycan types (last row for types missing from the dictionary).
+    def rows(self, glycan_types_list):
+        return np.array([self.glycan_types.index(t) if t in self.glycan_types else len(self.glycan_types) for t in glycan_types_list], dtype=np.int64)
+
+    ## Returns the columns of the given Lectins (last column for Lectins missing from the dictionary).
+    def columns(self, lectin_list):
+        return np.array([self.lectin_names.index(l) if l in self.lectin_names else len(self.lectin_names) for l in lectin_list], dtype=np.int64)
+
+    ## Resolves a batch of encounters at once. An encounter binds if its random draw (0--10000) does not exceed the
+    # multiplied densities scaled by \c probability, and then produces all Cytokines of its pair.
+    #
+    # \param[in]  rows      Rows (Glycan types) of the encounters
+    # \param[in]  columns   Columns (Lectins) of the encounters
+    # \param[in]  densities Multiplied densities of Glycan and Lectin of the encounters
+    # \param[in]  draws     Random numbers between 0 and 10000, one per encounter
+    # \param[out] pairs     Indices of the encounters producing a Cytokine (repeated for several Cytokines)
+    # \param[out] codes     Codes of the Cytokines produced (index in \c names)
+    def resolve(self, rows, columns, densities, draws):
+        bound = draws <= densities * self.probability[rows, columns]
+        codes = self.cytokines[rows, columns]
+        pairs, k = np.nonzero((codes >= 0) & bound[:, None])
+        return pairs, codes[pairs, k]
 
 
 ## Builder creates elements of the objects Well, Bead, and DecoderCell. The director of the Builder is the class
@@ -279,13 +1535,14 @@ class Builder:
     # \param[in] container_type Specifies the type of container (list or NumPy Array).
     # \param[in] n_beads        Number of Beads, passed to the constructor of Well subclass.
     # \param[in] n_cells        Number of Cells, passed to the constructor of Well subclass.
-    def buildWell(self, container_type, n_beads, n_cells):
-        self.well = container_type(self.x, self.y, self.z, n_beads, n_cells)
+    # \param[in] args           Further arguments passed to the constructor of Well subclass (e. g. replicates).
+    def buildWell(self, container_type, n_beads, n_cells, *args):
+        self.well = container_type(self.x, self.y, self.z, n_beads, n_cells, *args)
 
     ## Method to build instance of the type Bead.
     #
     # \param[in] i                  Position of respective Bead in NumPy Array.
-    # \param[in] ID                 Identifier used by the constructor of Bead.
+    # \param[in] ID                 Identifier used by the constructor of Bead (None: built from the position in the Well).
     # \param[in] glycan_name_string see documentation for class Glycan
     # \param[in] glycan_type_string see documentation for class Glycan
     # \param[in] density_percentage see documentation for class Glycan
@@ -295,30 +1552,399 @@ class Builder:
     ## Method to build instance of the type DecoderCell.
     #
     # \param[in] i                  Position of respective DecoderCell in NumPy Array.
-    # \param[in] ID                 Identifier used by the constructor of DecoderCell.
+    # \param[in] ID                 Identifier used by the constructor of DecoderCell (None: built from the position in the Well).
     # \param[in] lectin_name_string see documentation for class Lectin
     # \param[in] density_percentage see documentation for class Lectin
     def buildDecoderCell(self, i, ID, lectin_name_string, density_percentage):
         self.well.addDecoderCell(i, DecoderCell(ID), lectin_name_string, density_percentage)
 
+    ## Method to build all Beads and DecoderCells at once in a Well_vectorized (see \c Well_vectorized.populate).
+    #
+    # \param[in] glycan_names_list see documentation for class Glycan
+    # \param[in] glycan_types_list see documentation for class Glycan
+    # \param[in] glycan_density    see documentation for class Glycan
+    # \param[in] lectin_list       see documentation for class Lectin
+    # \param[in] lectin_density    see documentation for class Lectin
+    # \param[in] rng               NumPy random Generator (or list of Generators, one per replicate)
+    def buildParticles(self, glycan_names_list, glycan_types_list, glycan_density, lectin_list, lectin_density, rng):
+        self.well.populate(glycan_names_list, glycan_types_list, glycan_density, lectin_list, lectin_density, rng)
+
+
+## Profiler collects per-step measurements of a simulation: the wall-clock time of its phases (moving particles,
+# finding contacts, binding) and counters of the work done. Attach it to a Simulation (parameter \c profiler); without
+# a Profiler, simulate only checks for it once per phase. Instrumented are \c simulate for all Wells, with every Engine
+# (Engine_numba reports the move of the DecoderCells as part of the contacts), with step leaping (the search for
+# particles far from all contacts counts as contacts of the first step of a leap, the leap of these particles as move
+# of its last step; leaps are not counted as reflections), and with slabs (phases measured over all slabs; the
+# handover of particles between slabs counts as move).
+#
+# Counters:
+# - lookups:     DecoderCells looked up in the index of the Beads (each replaces the check against all Beads)
+# - colocations: pairs of DecoderCells and Beads sharing a position
+# - draws:       random numbers drawn for binding
+# - bindings:    Cytokines produced
+# - reflections: moves reflected at the borders of the Well
+#
+# \param rows List of dictionaries, one per step, with the step number, the times of the phases in s, and the counters
+class Profiler:
+    phases = ("move", "contacts", "binding")
+    counters = ("lookups", "colocations", "draws", "bindings", "reflections")
+
+    def __init__(self):
+        self.rows = []
+        self.current = None
+        self.clock = 0.0
+
+    ## Starts the measurement of step \c n.
+    def begin(self, n):
+        self.current = dict.fromkeys(("step",) + self.phases + self.counters, 0)
+        self.current["step"] = n
+        self.clock = time.perf_counter()
+
+    ## Adds the time since the last call (or \c begin) to \c phase.
+    def lap(self, phase):
+        now = time.perf_counter()
+        self.current[phase] += now - self.clock
+        self.clock = now
+
+    ## Adds \c value to the counter \c name.
+    def count(self, name, value):
+        self.current[name] += int(value)
+
+    ## Finishes the measurement of the current step.
+    def end(self):
+        self.rows.append(self.current)
+        self.current = None
+
+    ## Returns the sums of all phases and counters over all steps.
+    def totals(self):
+        return {key: sum(row[key] for row in self.rows) for key in self.phases + self.counters}
+
+    ## Returns the report as dictionary with the number of steps, the totals and all rows.
+    def report(self):
+        return {"steps": len(self.rows), "totals": self.totals(), "rows": self.rows}
+
+    ## Saves the report as JSON (\c report) or, if \c path ends with ".csv", as CSV with one line per step.
+    def save(self, path):
+        with open(path, "w", newline="") as f:
+            if path.endswith(".csv"):
+                writer = csv.DictWriter(f, fieldnames=("step",) + self.phases + self.counters)
+                writer.writeheader()
+                writer.writerows(self.rows)
+            else:
+                json.dump(self.report(), f, indent=1)
+
+
+## Reducer is the superclass of aggregates computed while a simulation runs (parameter \c reducers of
+# Simulation.simulate). The Cytokines produced in every step are fed to all reducers as one batch, so with
+# \c store_events=False only the aggregates are kept instead of every event. Reducers of the same class from
+# independent runs (replicates, slabs, points of a Sweep) are combined with \c merge. Cytokines are identified by
+# name, so runs may assign different codes to them.
+#
+# \param names      List of Cytokine names; column i of the aggregates belongs to names[i]
+# \param simulation Simulation feeding the reducer (see \c start). Not pickled.
+# \param source     List of Cytokine names of the CytokineBuffer of \c simulation when \c mapping was computed
+class Reducer:
+    def __init__(self):
+        self.names = []
+        self.simulation = None
+        self.source = []
+        self.mapping = np.zeros(0, dtype=np.int64)
+
+    def __getstate__(self):
+        return dict(self.__dict__, simulation=None)
+
+    ## Called by Simulation.simulate before the first step.
+    #
+    # \param[in] simulation Object of class Simulation
+    # \param[in] well       Object of class Well
+    # \param[in] steps      Number of steps
+    def start(self, simulation, well, steps):
+        self.simulation = simulation
+
+    ## Adds the Cytokines produced in step \c n.
+    #
+    # \param[in] n         Step number
+    # \param[in] cells     Array with the numbers of the DecoderCells
+    # \param[in] beads     Array with the numbers of the Beads
+    # \param[in] codes     Array with the codes of the Cytokines in the CytokineBuffer of the Simulation
+    # \param[in] positions Array of shape (n, 3) with the coordinates of production
+    def feed(self, n, cells, beads, codes, positions):
+        raise NotImplementedError
+
+    ## Adds the aggregates of \c other (same class) to this reducer and returns it.
+    def merge(self, other):
+        raise NotImplementedError
+
+    ## Returns the aggregate.
+    def result(self):
+        raise NotImplementedError
+
+    ## Returns the column of a Cytokine name. Unknown names are appended to \c names.
+    def column(self, name):
+        if name not in self.names:
+            self.names.append(name)
+        return self.names.index(name)
+
+    ## Returns the columns of the given codes of the CytokineBuffer of \c simulation. The names of the buffer are read
+    # on every call, since it may be replaced during a run (e. g. when a Recorder resumes from a checkpoint).
+    def columns(self, codes):
+        names = self.simulation.cytokines.names
+        if names is not self.source or len(self.mapping) < len(names):
+            self.source = names
+            self.mapping = np.array([self.column(name) for name in names], dtype=np.int64)
+        return self.mapping[codes]
+
+    ## Returns the columns of the names of \c other.
+    def columnsOf(self, other):
+        return np.array([self.column(name) for name in other.names], dtype=np.int64)
+
+    ## Returns \c array with its last axis enlarged to \c length (zero-filled).
+    @staticmethod
+    def fit(array, length):
+        if array.shape[-1] >= length:
+            return array
+        return np.concatenate([array, np.zeros(array.shape[:-1] + (length - array.shape[-1],), dtype=array.dtype)], axis=-1)
+
+
+## Counts the Cytokines of respective type, like Analysis.countCytokines.
+#
+# \param counts Array with the number of Cytokines per column of \c names
+class CytokineCounts(Reducer):
+    def __init__(self):
+        super().__init__()
+        self.counts = np.zeros(0, dtype=np.int64)
+
+    def feed(self, n, cells, beads, codes, positions):
+        columns = self.columns(codes)
+        self.counts = self.fit(self.counts, len(self.names))
+        self.counts += np.bincount(columns, minlength=len(self.names))
+
+    def merge(self, other):
+        columns = self.columnsOf(other)
+        self.counts = self.fit(self.counts, len(self.names))
+        self.counts[columns[:len(other.counts)]] += other.counts
+        return self
+
+    ## Returns the list of names and the list of amounts.
+    def result(self):
+        self.counts = self.fit(self.counts, len(self.names))
+        return [list(self.names), self.counts.tolist()]
+
+
+## Counts the Cytokines of respective type produced in every step, like Analysis.timeSeries.
+#
+# \param[in] steps  Number of steps (optional, default: number of steps of the simulation)
+# \param     series Array of shape (cytokines, steps)
+class StepSeries(Reducer):
+    def __init__(self, steps=None):
+        super().__init__()
+        self.series = np.zeros((0, steps or 0), dtype=np.int64)
+
+    def start(self, simulation, well, steps):
+        super().start(simulation, well, steps)
+        self.resize(0, steps)
+
+    ## Enlarges \c series to at least \c cytokines rows and \c steps columns.
+    def resize(self, cytokines, steps):
+        rows, width = self.series.shape
+        if cytokines > rows or steps > width:
+            series = np.zeros((max(cytokines, rows), max(steps, width)), dtype=np.int64)
+            series[:rows, :width] = self.series
+            self.series = series
+
+    def feed(self, n, cells, beads, codes, positions):
+        columns = self.columns(codes)
+        self.resize(len(self.names), n + 1)
+        self.series[:, n] += np.bincount(columns, minlength=len(self.series))
+
+    def merge(self, other):
+        columns = self.columnsOf(other)
+        self.resize(len(self.names), other.series.shape[1])
+        self.series[columns[:len(other.series)], :other.series.shape[1]] += other.series
+        return self
+
+    ## Returns the array of shape (cytokines, steps); row i belongs to names[i].
+    def result(self):
+        self.resize(len(self.names), 0)
+        return self.series
+
+
+## Bins the coordinates of production into a 3D density map covering the whole Well, like Analysis.densityMap with
+# the size of the Well.
+#
+# \param[in] bins    Number of bins per dimension (int or sequence of three ints)
+# \param     size    Size of the Well (set by \c start)
+# \param     density Array of shape (bins_x, bins_y, bins_z) with the number of Cytokines per bin
+class SpatialHistogram(Reducer):
+    def __init__(self, bins=20):
+        super().__init__()
+        self.bins = np.broadcast_to(np.asarray(bins, dtype=np.int64), (3,)).copy()
+        self.size = None
+        self.density = np.zeros(self.bins, dtype=np.int64)
+
+    def start(self, simulation, well, steps):
+        super().start(simulation, well, steps)
+        if self.size is not None and not np.array_equal(self.size, well.size):
+            sys.exit("SpatialHistogram was used with a Well of different size!")
+        self.size = np.asarray(well.size, dtype=np.int64)
+
+    def feed(self, n, cells, beads, codes, positions):
+        positions = np.asarray(positions, dtype=np.int64)
+        flat = np.zeros(len(positions), dtype=np.int64)
+        for axis in range(3):
+            flat = flat * self.bins[axis] + positions[:, axis] * self.bins[axis] // (self.size[axis] + 1)
+        self.density += np.bincount(flat, minlength=self.density.size).reshape(self.bins)
+
+    def merge(self, other):
+        if not np.array_equal(self.bins, other.bins) or (self.size is not None and other.size is not None and not np.array_equal(self.size, other.size)):
+            sys.exit("SpatialHistograms with different bins or Well sizes cannot be merged!")
+        if self.size is None:
+            self.size = other.size
+        self.density += other.density
+        return self
+
+    ## Returns the density map and the list of the three arrays of bin edges.
+    def result(self):
+        return self.density, [np.linspace(0, self.size[axis] + 1, self.bins[axis] + 1) for axis in range(3)]
+
+
+## Counts the Cytokines of respective type produced by every DecoderCell.
+#
+# \param tally Array of shape (DecoderCells, cytokines)
+class CellTally(Reducer):
+    def __init__(self):
+        super().__init__()
+        self.tally = np.zeros((0, 0), dtype=np.int64)
+
+    def start(self, simulation, well, steps):
+        super().start(simulation, well, steps)
+        self.resize(simulation.n_decoder, 0)
+
+    ## Enlarges \c tally to at least \c cells rows and \c cytokines columns.
+    def resize(self, cells, cytokines):
+        rows, width = self.tally.shape
+        if cells > rows or cytokines > width:
+            tally = np.zeros((max(cells, rows), max(cytokines, width)), dtype=np.int64)
+            tally[:rows, :width] = self.tally
+            self.tally = tally
+
+    def feed(self, n, cells, beads, codes, positions):
+        columns = self.columns(codes)
+        self.resize(int(cells.max()) + 1 if len(cells) else 0, len(self.names))
+        np.add.at(self.tally, (cells, columns), 1)
+
+    def merge(self, other):
+        columns = self.columnsOf(other)
+        self.resize(len(other.tally), len(self.names))
+        self.tally[:len(other.tally), columns[:other.tally.shape[1]]] += other.tally
+        return self
+
+    ## Returns the array of shape (DecoderCells, cytokines); column i belongs to names[i].
+    def result(self):
+        self.resize(0, len(self.names))
+        return self.tally
+
 
 ## Simulation contains methods to create the model by calling methods of call Builder, and to run simulations. It
 # contains the dictionary for binding specificity and cytokine expression.
 #
 # \param[in] numberOfBeads        Number of objects of class Bead to be created
 # \param[in] numberOfDecoderCells Number of  to be created
-# \param     cytokines            List containing of objects of class Cytokine
+# \param[in] seed                 Seed, SeedSequence or RandomStream of all random numbers of the Simulation (optional,
+#                                 default: fresh entropy)
+# \param[in] backend              Engine performing the steps with Well_vectorized: "numpy", "numba", or "auto" (see
+#                                 class Engine)
+# \param[in] profiler             Object of class Profiler measuring the steps of \c simulate (optional)
+# \param     observers            Functions called as observer(n, simulation, well) after every step n (see
+#                                 \c addObserver)
+# \param     stream               RandomStream of the Simulation
+# \param     rng                  NumPy random Generator of \c stream, used with Well_vectorized
+# \param     seed_sequence        SeedSequence of \c stream, from which the streams of replicates and slabs are spawned
+# \param     cytokines            CytokineBuffer containing all binding events (if \c store_events is set)
+# \param     reducers             List of Reducers fed with the binding events of every step (see \c simulate)
+# \param     store_events         Whether the binding events are stored in \c cytokines
+# \param     recorder             Recorder fed with the binding events of every step during \c simulate (or None)
+# \param     events               Number of binding events produced so far
 # \param     cytokine_dict        Dictionary for binding specificity and cytokine expression
 class Simulation:
-    def __init__(self, numberOfBeads, numberOfDecoderCells):
+    def __init__(self, numberOfBeads, numberOfDecoderCells, seed=None, backend="numpy", profiler=None):
         self.n_beads = numberOfBeads
         self.n_decoder = numberOfDecoderCells
-        self.cytokines = []
+        self.backend = backend
+        self.profiler = profiler
+        self.observers = []
+        self.stream = seed if isinstance(seed, RandomStream) else RandomStream(seed)
+        self.seed_sequence = self.stream.seed_sequence
+        self.rng = self.stream.generator
+        self.cytokines = CytokineBuffer()
+        self.reducers = []
+        self.store_events = True
+        self.recorder = None
+        self.events = 0
         self.cytokine_dict = {"Man": {"DC-SIGN": ("IL-6"), "Dectin-1": ("IL-6")},
                               "Fuc": {"DC-SIGN": ("IL-27p28")}}
 
+    ## Registers a function called as observer(n, simulation, well) after every step n of \c simulate (after every leap
+    # with step leaping, n being the last step of the leap).
+    def addObserver(self, observer):
+        self.observers.append(observer)
+
+    ## Records the Cytokines produced in step \c n: stores them in \c cytokines (if \c store_events is set) and feeds them
+    # to all \c reducers and the \c recorder.
+    #
+    # \param[in] n         Step number
+    # \param[in] cells     Array with the numbers of the DecoderCells
+    # \param[in] beads     Array with the numbers of the Beads
+    # \param[in] codes     Array with the codes of the Cytokines in \c cytokines
+    # \param[in] positions Array of shape (n, 3) with the coordinates of production
+    def record(self, n, cells, beads, codes, positions):
+        if self.store_events:
+            self.cytokines.extend(n, cells, beads, codes, positions)
+        for reducer in self.reducers:
+            reducer.feed(n, cells, beads, codes, positions)
+        if self.recorder is not None:
+            self.recorder.feed(n, cells, beads, codes, positions)
+        self.events += len(cells)
+
+    ## Feeds events already stored in \c cytokines (e. g. restored from a checkpoint) to all \c reducers, step by step,
+    # and counts them in \c events.
+    #
+    # \param[in] events Structured array of events sorted by step (see CytokineBuffer)
+    def replay(self, events):
+        for part in np.split(events, np.flatnonzero(np.diff(events["step"])) + 1):
+            if len(part):
+                positions = np.stack([part["x"], part["y"], part["z"]], axis=1)
+                for reducer in self.reducers:
+                    reducer.feed(int(part["step"][0]), part["cell"], part["bead"], part["cytokine"], positions)
+        self.events += len(events)
+
+    ## Ensures that the dictionary contains all entered glycan and lectin types. Otherwise, the program terminates.
+    #
+    # \param[in] glycan_types_list see documentation for class Glycan
+    # \param[in] lectin_list       see documentation for class Lectin
+    def checkDictionary(self, glycan_types_list, lectin_list):
+        BindingTable(self.cytokine_dict).validate(glycan_types_list, lectin_list)
+
+    ## Returns the names of all cytokines in the dictionary in order of appearance, without duplicates.
+    def cytokineNames(self):
+        return BindingTable(self.cytokine_dict).names
+
+    ## Compiles the cytokine dictionary into a BindingTable for a Well_vectorized. Additionally, the table gets the rows
+    # and columns of the Glycan and Lectin codes of the Well (\c glycan_rows, \c lectin_columns) and the codes of its
+    # Cytokines in self.cytokines (\c buffer_codes).
+    #
+    # \param[in] well Object of class Well_vectorized
+    def compileBindingTable(self, well):
+        table = BindingTable(self.cytokine_dict)
+        table.glycan_rows = table.rows(well.glycan_types)
+        table.lectin_columns = table.columns(well.lectin_names)
+        table.buffer_codes = np.array([self.cytokines.code(name) for name in table.names], dtype=np.int16)
+        return table
+
     ## At the beginning, it is ensured that the dictionary contains all entered glycan and lectin types. Then, the
-    # builder is directed to create one object of class Well and instances of the classes Bead and DecoderCell.
+    # builder is directed to create one object of class Well and instances of the classes Bead and DecoderCell. A
+    # Well_vectorized is populated in bulk instead, with positions, Glycans and Lectins drawn from \c rng at once.
     #
     # \param[in]  builder           Object of class Builder
     # \param[in]  container_type    see documentation for class Builder
@@ -329,92 +1955,801 @@ class Simulation:
     # \param[in]  lectin_density    see documentation for class Lectin
     # \param[out] builder.well      Object of class Well created by Builder, containing objects of classes Bead and DecoderCell
     def createModel(self, builder, container_type, glycan_names_list, glycan_types_list, glycan_density, lectin_list, lectin_density):
-        allLinD = []
-        for i in range(len(glycan_types_list)):
-            if glycan_types_list[i] not in self.cytokine_dict:
-                sys.exit("Glycan Type not in Dictionary!")
-        for lectins, cytokines in self.cytokine_dict.items():
-            for l, c in cytokines.items():
-                allLinD.append(l)
-        allLinD=list(set(allLinD))
-        for j in range(len(lectin_list)):
-            if lectin_list[j] not in allLinD:
-                sys.exit("Lectin not in Dictionary!")
+        self.checkDictionary(glycan_types_list, lectin_list)
 
         builder.buildWell(container_type, self.n_beads, self.n_decoder)
+        builder.well.stream = self.stream
+        if isinstance(builder.well, Well_vectorized):
+            builder.buildParticles(glycan_names_list, glycan_types_list, glycan_density, lectin_list, lectin_density, self.rng)
+            return builder.well
 
-        for i in range(self.n_beads):
-            ID = "Bead_" + str(i)
-            builder.buildBead(i, ID, glycan_names_list, glycan_types_list, glycan_density)
+        for i in range(self.n_beads): # IDs "Bead_<i>" are built on access (see class Sphere)
+            builder.buildBead(i, None, glycan_names_list, glycan_types_list, glycan_density)
 
         for i in range(self.n_decoder):
-            ID = "DecoderCell_" + str(i)
-            builder.buildDecoderCell(i, ID, lectin_list, lectin_density)
+            builder.buildDecoderCell(i, None, lectin_list, lectin_density)
         return builder.well
 
-    ## The simulation itself. First, all Beads and all DecoderCells move once. Then, for every Bead it is tested if
-    # there's a DecoderCell at the same position (Beads can be bound by different Cells successively). If this is true
-    # and the mutiplied densities exceed a random number, the cytokine dictionary is inquired. If the Lectin on the
-    # DecoderCell and the Glycan on the Bead match, the a object of the class Cytokine of the respective type is
-    # produced and stored in the self.cytokines list.
+    ## The simulation itself. First, all Beads and all DecoderCells move once. Then, all pairs of DecoderCells and Beads
+    # at the same position are looked up in a VoxelIndex of the Beads (Beads can be bound by different Cells
+    # successively). For every such pair, if the mutiplied densities exceed a random number, the cytokine dictionary is inquired. If the Lectin on the
+    # DecoderCell and the Glycan on the Bead match, the respective Cytokine is recorded in the self.cytokines buffer.
+    #
+    # Instead of (or in addition to) storing every Cytokine, aggregates can be computed on the fly by Reducers (e. g.
+    # CytokineCounts, StepSeries, SpatialHistogram, CellTally), which are fed with the Cytokines of every step. With
+    # \c store_events=False, memory only grows with the aggregates, not with the number of Cytokines.
     #
     # \param[in]  well      Object of class Well produced by method createModel
     # \param[in]  steps     Number of steps
-    # \param[out] cytokines List containing objects of type Cytokine and the coordinates of production
-    def simulate(self, well, steps):
+    # \param[in]  recorder  Object of class Recorder writing trajectory and checkpoints (optional, Well_vectorized only)
+    # \param[in]  leap      Maximum number of steps taken at once by particles far from all possible contacts (optional,
+    #                       Well_vectorized only, see \c simulateLeaping)
+    # \param[in]  slabs     Number of slabs along z processed in parallel (optional, Well_vectorized only, see
+    #                       \c simulateSlabs)
+    # \param[in]  threads      Number of threads for the slabs (optional, default: one per slab)
+    # \param[in]  reducers     List of objects of subclasses of Reducer (optional)
+    # \param[in]  store_events Whether the Cytokines are stored in self.cytokines
+    # \param[out] cytokines    CytokineBuffer containing the Cytokines produced and the coordinates of production
+    def simulate(self, well, steps, recorder=None, leap=None, slabs=None, threads=None, reducers=None, store_events=True):
+        self.reducers = list(reducers or [])
+        self.store_events = store_events
+        self.recorder = None
+        for reducer in self.reducers:
+            reducer.start(self, well, steps)
+        if slabs is not None:
+            if not isinstance(well, Well_vectorized) or recorder is not None or leap is not None:
+                sys.exit("Slabs require a Well of class Well_vectorized, no Recorder and no step leaping!")
+            return self.simulateSlabs(well, steps, slabs, threads)
+        if leap is not None:
+            if not isinstance(well, Well_vectorized) or recorder is not None:
+                sys.exit("Step leaping requires a Well of class Well_vectorized and no Recorder!")
+            return self.simulateLeaping(well, steps, leap)
+        if isinstance(well, Well_vectorized):
+            return self.simulateVectorized(well, steps, recorder)
+        if recorder is not None:
+            sys.exit("Recording requires a Well of class Well_vectorized!")
+        index = VoxelIndex(well.size)
+        table = BindingTable(self.cytokine_dict)
+        profiler = self.profiler
         for n in range(steps): # n: step number
-            for j in range(len(well.beads)): # j: bead number
-                (dx, dy, dz) = random.choice([(0, 0, 1), (0, 1, 0), (1, 0, 0), (0, 0, -1), (0, -1, 0), (-1, 0, 0)])
-                dc=well.borderControl(well.beads[j].coordinates, dx, dy, dz)
-                for (i, coordinate) in enumerate(well.beads[j].coordinates):
-                    well.beads[j].coordinates[i] += dc[i]
-            for k in range(len(well.decoderCells)):
-                (dx, dy, dz) = random.choice([(0, 0, 1), (0, 1, 0), (1, 0, 0), (0, 0, -1), (0, -1, 0), (-1, 0, 0)])
-                dc=well.borderControl(well.decoderCells[k].coordinates, dx, dy, dz)
-                for (i, coordinate) in enumerate(well.decoderCells[k].coordinates):
-                    well.decoderCells[k].coordinates[i] += dc[i]
-                for l in range(len(well.beads)): # checks for every Bead if there's a Cell at the same position.
-                    same = True
-                    for i in range(len(well.decoderCells[k].coordinates)):
-                        same = (well.decoderCells[k].coordinates[i] == well.beads[l].coordinates[i])
-                    if same:
-                        if random.uniform(0, 10000) <= well.beads[l].glycan_density * well.decoderCells[k].lectin_density:
-                            if well.decoderCells[k].lectin.name in self.cytokine_dict[well.beads[l].glycan.type]:
-                                self.cytokines.append(Cytokine(self.cytokine_dict[well.beads[l].glycan.type][well.decoderCells[k].lectin.name], well.decoderCells[k].coordinates))
+            recorded = self.events
+            if profiler is not None:
+                profiler.begin(n)
+            reflections = self.moveParticles(well)
+            if profiler is not None:
+                profiler.lap("move")
+                profiler.count("reflections", reflections)
+            self.indexBeads(well, index)
+            cells, beads = self.findContacts(well, index)
+            if profiler is not None:
+                profiler.lap("contacts")
+                profiler.count("lookups", len(well.decoderCells))
+                profiler.count("colocations", len(cells))
+            events = []
+            draws = (self.stream.uniforms(len(cells)) * 10000).tolist()
+            for k, l, draw in zip(cells, beads, draws):
+                if draw <= well.beads[l].glycan_density * well.decoderCells[k].lectin_density:
+                    for name in table.lookup(well.beads[l].glycan.type, well.decoderCells[k].lectin.name):
+                        events.append((k, l, self.cytokines.code(name), *well.decoderCells[k].coordinates))
+            events = np.array(events, dtype=np.int64).reshape(-1, 6)
+            self.record(n, events[:, 0], events[:, 1], events[:, 2], events[:, 3:])
+            if profiler is not None:
+                profiler.lap("binding")
+                profiler.count("draws", len(cells))
+                profiler.count("bindings", self.events - recorded)
+                profiler.end()
+            for observer in self.observers:
+                observer(n, self, well)
         return self.cytokines
 
+    ## First phase of a step: all Beads and then all DecoderCells take one step of the random walk. Returns the number of
+    # moves reflected at the borders of the Well.
+    #
+    # \param[in] well Object of class Well
+    def moveParticles(self, well):
+        if isinstance(well, Well_vectorized):
+            return well.randomWalk(well.bead_positions, self.rng) + well.randomWalk(well.cell_positions, self.rng)
+        reflections = 0
+        moves = [(0, 0, 1), (0, 1, 0), (1, 0, 0), (0, 0, -1), (0, -1, 0), (-1, 0, 0)]
+        choices = iter(self.stream.integers(6, len(well.beads) + len(well.decoderCells)).tolist()) # one block per step
+        stores = well.coordinateStores() if isinstance(well, Well_list) else (None, None)
+        for particles, store in zip((well.beads, well.decoderCells), stores):
+            if store is not None: # all coordinates in one shared array, in the order of the particles
+                for offset, choice in zip(range(0, len(store), 3), choices):
+                    (dx, dy, dz) = moves[choice]
+                    dc=well.borderControl(store[offset:offset + 3], dx, dy, dz)
+                    reflections += dc != (dx, dy, dz)
+                    store[offset] += dc[0]
+                    store[offset + 1] += dc[1]
+                    store[offset + 2] += dc[2]
+                continue
+            for particle, choice in zip(particles, choices):
+                (dx, dy, dz) = moves[choice]
+                coordinates = particle.coordinates
+                dc=well.borderControl(coordinates, dx, dy, dz)
+                reflections += dc != (dx, dy, dz)
+                for i in range(3):
+                    coordinates[i] += dc[i]
+        return reflections
+
+    ## Second phase of a step: (re)builds the VoxelIndex of the Beads at their current positions.
+    #
+    # \param[in] well  Object of class Well
+    # \param[in] index Object of class VoxelIndex
+    def indexBeads(self, well, index):
+        if isinstance(well, Well_vectorized):
+            index.build(well.bead_positions)
+        else:
+            index.build(well.coordinateArray(well.beads))
+
+    ## Third phase of a step: finds all pairs of DecoderCells \c start to \c stop and Beads sharing a position.
+    #
+    # \param[in]  well  Object of class Well
+    # \param[in]  index VoxelIndex of the Beads
+    # \param[in]  start First DecoderCell (optional)
+    # \param[in]  stop  DecoderCell after the last one (optional, default: all)
+    # \param[out] cells Numbers of the DecoderCells of all pairs, sorted
+    # \param[out] beads Numbers of the Beads of all pairs
+    def findContacts(self, well, index, start=0, stop=None):
+        if isinstance(well, Well_vectorized):
+            positions = well.cell_positions[start:stop]
+        else:
+            positions = well.coordinateArray(well.decoderCells[start:stop])
+        cells, beads = index.query(positions)
+        return cells + start, beads
+
+    ## Last phase of a step for Well_vectorized: for every pair of co-located DecoderCell and Bead, a random number is
+    # compared to the multiplied densities, and matching pairs of Lectin and Glycan are recorded as Cytokines. All pairs
+    # are resolved at once with the compiled BindingTable.
+    #
+    # \param[in] well  Object of class Well_vectorized
+    # \param[in] n     Step number
+    # \param[in] cells Numbers of the DecoderCells of all pairs
+    # \param[in] beads Numbers of the Beads of all pairs
+    # \param[in] table BindingTable compiled for the Well by \c compileBindingTable
+    def bindParticles(self, well, n, cells, beads, table):
+        cells, beads, codes = self.resolveBindings(well, cells, beads, table, self.rng)
+        self.record(n, cells, beads, codes, well.cell_positions[cells])
+
+    ## Returns the pairs of \c bindParticles producing a Cytokine without recording them.
+    #
+    # \param[in]  well  Object of class Well_vectorized
+    # \param[in]  cells Numbers of the DecoderCells of all pairs
+    # \param[in]  beads Numbers of the Beads of all pairs
+    # \param[in]  table BindingTable compiled for the Well by \c compileBindingTable
+    # \param[in]  rng   NumPy random Generator for the comparison with the densities
+    # \param[out] cells Numbers of the DecoderCells producing a Cytokine (once per Cytokine)
+    # \param[out] beads Numbers of the respective Beads
+    # \param[out] codes Codes of the Cytokines in self.cytokines
+    def resolveBindings(self, well, cells, beads, table, rng):
+        draws = rng.uniform(0, 10000, len(cells))
+        densities = well.bead_densities[beads].astype(np.float64) * well.cell_densities[cells]
+        pairs, codes = table.resolve(table.glycan_rows[well.bead_glycans[beads]], table.lectin_columns[well.cell_lectins[cells]], densities, draws)
+        return cells[pairs], beads[pairs], table.buffer_codes[codes]
+
+    ## Same simulation as \c simulate, but for objects of class Well_vectorized. In every step, all Beads and all
+    # DecoderCells move at once (performed by the Engine chosen by \c backend). Then all pairs of DecoderCells and Beads
+    # sharing a position are determined and for every pair a random number is compared to the multiplied densities.
+    # Matching pairs of Lectin and Glycan produce a Cytokine as described by the cytokine dictionary.
+    #
+    # If a Recorder is given, the run continues from its last checkpoint (if any), and positions and events are
+    # streamed to disk. The events recorded before the checkpoint are fed to the reducers before the first step.
+    #
+    # \param[in]  well      Object of class Well_vectorized produced by method createModel
+    # \param[in]  steps     Number of steps
+    # \param[in]  recorder  Object of class Recorder (optional)
+    # \param[out] cytokines CytokineBuffer containing the Cytokines produced and the coordinates of production
+    def simulateVectorized(self, well, steps, recorder=None):
+        first = 0
+        if recorder is not None:
+            first = recorder.start(self, well, steps)
+        table = self.compileBindingTable(well)
+        engine = Engine.create(self.backend)
+        engine.prepare(well)
+        engine.profiler = profiler = self.profiler
+        self.recorder = recorder
+        for n in range(first, steps): # n: step number
+            recorded = self.events
+            if profiler is not None:
+                profiler.begin(n)
+            cells, beads = engine.step(well, self.rng)
+            self.bindParticles(well, n, cells, beads, table)
+            if profiler is not None:
+                profiler.lap("binding")
+                profiler.count("draws", len(cells))
+                profiler.count("bindings", self.events - recorded)
+                profiler.end()
+            if recorder is not None:
+                recorder.record(n, self, well)
+            for observer in self.observers:
+                observer(n, self, well)
+        self.recorder = None
+        if recorder is not None:
+            recorder.close(self, well)
+        return self.cytokines
+
+    ## Same simulation as \c simulateVectorized, but particles which cannot meet a particle of the other kind within the
+    # next \c leap steps, i. e. are more than 2 * \c leap lattice units away from all of them (see
+    # Well_vectorized.closeParticles), take these steps at once (see Well_vectorized.leapWalk). Only the remaining
+    # DecoderCells and Beads take single steps with contact detection and binding. The Cytokines produced follow the
+    # same distribution as with \c simulateVectorized, but the random numbers are used differently, so results for the
+    # same seed differ. The fewer particles per volume, the more steps are skipped; at the density of the standard
+    # experiment, the classification costs more than it saves.
+    #
+    # \param[in]  well      Object of class Well_vectorized produced by method createModel
+    # \param[in]  steps     Number of steps
+    # \param[in]  leap      Maximum number of steps taken at once
+    # \param[out] cytokines CytokineBuffer containing the Cytokines produced and the coordinates of production
+    def simulateLeaping(self, well, steps, leap=4):
+        if well.replicates is not None:
+            sys.exit("Step leaping requires a Well without replicate axis!")
+        if leap < 1:
+            sys.exit("The number of steps of a leap must be at least 1!")
+        table = self.compileBindingTable(well)
+        index = VoxelIndex(well.size)
+        profiler = self.profiler
+        n = 0 # n: step number
+        while n < steps:
+            k = min(leap, steps - n)
+            if profiler is not None:
+                profiler.begin(n)
+            close_cells, close_beads = well.closeParticles(2 * k)
+            near_cells, far_cells = np.flatnonzero(close_cells), ~close_cells
+            near_beads, far_beads = np.flatnonzero(close_beads), ~close_beads
+            bead_positions = well.bead_positions[near_beads]
+            cell_positions = well.cell_positions[near_cells]
+            if profiler is not None:
+                profiler.lap("contacts")
+            for m in range(n, n + k):
+                recorded = self.events
+                if profiler is not None and m > n:
+                    profiler.begin(m)
+                reflections = well.randomWalk(bead_positions, self.rng) + well.randomWalk(cell_positions, self.rng)
+                well.cell_positions[near_cells] = cell_positions
+                if profiler is not None:
+                    profiler.lap("move")
+                    profiler.count("reflections", reflections)
+                index.build(bead_positions)
+                cells, beads = index.query(cell_positions)
+                if profiler is not None:
+                    profiler.lap("contacts")
+                    profiler.count("lookups", len(cell_positions))
+                    profiler.count("colocations", len(cells))
+                self.bindParticles(well, m, near_cells[cells], near_beads[beads], table)
+                if profiler is not None:
+                    profiler.lap("binding")
+                    profiler.count("draws", len(cells))
+                    profiler.count("bindings", self.events - recorded)
+                    if m < n + k - 1:
+                        profiler.end()
+            well.bead_positions[near_beads] = bead_positions
+            positions = well.bead_positions[far_beads]
+            well.leapWalk(positions, k, self.rng)
+            well.bead_positions[far_beads] = positions
+            positions = well.cell_positions[far_cells]
+            well.leapWalk(positions, k, self.rng)
+            well.cell_positions[far_cells] = positions
+            if profiler is not None:
+                profiler.lap("move")
+                profiler.end()
+            n += k
+            for observer in self.observers:
+                observer(n - 1, self, well)
+        return self.cytokines
+
+    ## Same simulation as \c simulateVectorized, but the Well is divided into \c slabs slabs of equal thickness along z,
+    # which are processed on a pool of threads. Every slab owns the particles inside it and has its own random stream
+    # spawned from \c seed_sequence, so results only depend on the number of slabs, not on the number of threads or
+    # their timing. A step has three phases:
+    #
+    # 1. Every slab moves its particles.
+    # 2. Particles which have crossed the border of their slab are handed over to the neighbouring slab.
+    # 3. Every slab finds the pairs of its DecoderCells and Beads sharing a position and resolves their binding.
+    #
+    # Contacts require the same voxel, so after the exchange of phase 2 both partners of every contact belong to the same
+    # slab and no halo of neighbouring layers is needed. The Cytokines of a step are recorded slab by slab. Most of the
+    # work is done by NumPy routines releasing the GIL, so the threads run in parallel.
+    #
+    # \param[in]  well      Object of class Well_vectorized produced by method createModel
+    # \param[in]  steps     Number of steps
+    # \param[in]  slabs     Number of slabs
+    # \param[in]  threads   Number of threads (optional, default: one per slab)
+    # \param[out] cytokines CytokineBuffer containing the Cytokines produced and the coordinates of production
+    def simulateSlabs(self, well, steps, slabs, threads=None):
+        if well.replicates is not None:
+            sys.exit("Slabs require a Well without replicate axis!")
+        if not 1 <= slabs <= well.size[2] + 1:
+            sys.exit("The number of slabs must be between 1 and the number of layers of the Well!")
+        table = self.compileBindingTable(well)
+        streams = [stream.generator for stream in self.stream.spawn(slabs)]
+        indices = [VoxelIndex(well.size) for _ in range(slabs)]
+        thickness = -(-(int(well.size[2]) + 1) // slabs)
+
+        def split(ids, positions):
+            owners = positions[ids, 2] // thickness
+            return [ids[owners == s] for s in range(slabs)]
+
+        def move(s):
+            parts = []
+            reflections = 0
+            for ids, positions in ((bead_ids[s], well.bead_positions), (cell_ids[s], well.cell_positions)):
+                moved = positions[ids]
+                reflections += well.randomWalk(moved, streams[s])
+                positions[ids] = moved
+                owners = moved[:, 2] // thickness
+                parts.append({t: ids[owners == t] for t in (s - 1, s, s + 1)})
+            return parts + [reflections]
+
+        def contacts(s):
+            indices[s].build(well.bead_positions[bead_ids[s]])
+            cells, beads = indices[s].query(well.cell_positions[cell_ids[s]])
+            return cell_ids[s][cells], bead_ids[s][beads]
+
+        def bind(s):
+            return self.resolveBindings(well, *pairs[s], table, streams[s])
+
+        bead_ids = split(np.arange(len(well.bead_positions)), well.bead_positions)
+        cell_ids = split(np.arange(len(well.cell_positions)), well.cell_positions)
+        profiler = self.profiler
+        with ThreadPoolExecutor(max_workers=threads or slabs) as pool:
+            for n in range(steps): # n: step number
+                recorded = self.events
+                if profiler is not None:
+                    profiler.begin(n)
+                parts = list(pool.map(move, range(slabs)))
+                for k, ids in enumerate((bead_ids, cell_ids)):
+                    for s in range(slabs):
+                        incoming = [parts[t][k][s] for t in (s - 1, s, s + 1) if 0 <= t < slabs]
+                        ids[s] = np.sort(np.concatenate(incoming))
+                if profiler is not None:
+                    profiler.lap("move")
+                    profiler.count("reflections", sum(part[2] for part in parts))
+                pairs = list(pool.map(contacts, range(slabs)))
+                if profiler is not None:
+                    profiler.lap("contacts")
+                    profiler.count("lookups", len(well.cell_positions))
+                    profiler.count("colocations", sum(len(cells) for cells, beads in pairs))
+                for cells, beads, codes in pool.map(bind, range(slabs)):
+                    self.record(n, cells, beads, codes, well.cell_positions[cells])
+                if profiler is not None:
+                    profiler.lap("binding")
+                    profiler.count("draws", sum(len(cells) for cells, beads in pairs))
+                    profiler.count("bindings", self.events - recorded)
+                    profiler.end()
+                for observer in self.observers:
+                    observer(n, self, well)
+        return self.cytokines
+
+    ## Runs \c replicates independent replicates of the same configuration together in one vectorized simulation. The
+    # Well is of class Well_vectorized with a leading replicate axis, and every replicate draws from its own random
+    # stream spawned from \c seed_sequence. Replicates only interact with particles of the same replicate. Cytokines
+    # are not stored individually but counted per replicate.
+    #
+    # \param[in]  builder           Object of class Builder
+    # \param[in]  glycan_names_list see documentation for class Glycan
+    # \param[in]  glycan_types_list see documentation for class Glycan
+    # \param[in]  glycan_density    see documentation for class Glycan
+    # \param[in]  lectin_list       see documentation for class Lectin
+    # \param[in]  lectin_density    see documentation for class Lectin
+    # \param[in]  steps             Number of steps
+    # \param[in]  replicates        Number of replicates
+    # \param[in]  confidence        Confidence level of the confidence intervals (normal approximation)
+    # \param[out] ensemble          Dictionary with the names of all cytokines of the dictionary, the counts per
+    #                               replicate (array of shape (replicates, cytokines)), their mean and confidence interval
+    def simulateEnsemble(self, builder, glycan_names_list, glycan_types_list, glycan_density, lectin_list, lectin_density, steps, replicates, confidence=0.95):
+        self.checkDictionary(glycan_types_list, lectin_list)
+        streams = [stream.generator for stream in self.stream.spawn(replicates)]
+        builder.buildWell(Well_vectorized, self.n_beads, self.n_decoder, replicates)
+        well = builder.well
+        builder.buildParticles(glycan_names_list, glycan_types_list, glycan_density, lectin_list, lectin_density, streams)
+
+        table = BindingTable(self.cytokine_dict)
+        names = table.names
+        counts = np.zeros((replicates, len(names)), dtype=np.int64)
+        glycan_rows = table.rows(well.glycan_types)
+        lectin_columns = table.columns(well.lectin_names)
+        bead_groups = np.repeat(np.arange(replicates), self.n_beads)
+        cell_groups = np.repeat(np.arange(replicates), self.n_decoder)
+        bead_densities = well.bead_densities.reshape(-1)
+        cell_densities = well.cell_densities.reshape(-1)
+        bead_glycans = well.bead_glycans.reshape(-1)
+        cell_lectins = well.cell_lectins.reshape(-1)
+        index = VoxelIndex(well.size)
+        block = 32 # steps of the random walk are drawn in blocks of this many steps per replicate
+        for n in range(steps): # n: step number
+            if n % block == 0:
+                length = min(block, steps - n)
+                choices = np.stack([stream.integers(0, 6, (length, self.n_beads + self.n_decoder), dtype=np.int8) for stream in streams])
+            well.randomWalk(well.bead_positions.reshape(-1, 3), None, choices[:, n % block, :self.n_beads].reshape(-1))
+            well.randomWalk(well.cell_positions.reshape(-1, 3), None, choices[:, n % block, self.n_beads:].reshape(-1))
+            index.build(well.bead_positions.reshape(-1, 3), bead_groups)
+            cells, beads = index.query(well.cell_positions.reshape(-1, 3), cell_groups)
+            bounds = np.searchsorted(cells, np.arange(replicates + 1) * self.n_decoder)
+            for r in np.flatnonzero(np.diff(bounds)): # pairs are sorted by cell, hence by replicate
+                k = cells[bounds[r]:bounds[r + 1]]
+                l = beads[bounds[r]:bounds[r + 1]]
+                draws = streams[r].uniform(0, 10000, len(k))
+                densities = bead_densities[l].astype(np.float64) * cell_densities[k]
+                _, codes = table.resolve(glycan_rows[bead_glycans[l]], lectin_columns[cell_lectins[k]], densities, draws)
+                counts[r] += np.bincount(codes, minlength=len(names))
+
+        mean = counts.mean(axis=0)
+        std = counts.std(axis=0, ddof=1) if replicates > 1 else np.zeros(len(names))
+        half_width = NormalDist().inv_cdf(0.5 + confidence / 2) * std / np.sqrt(replicates)
+        self.ensemble = {"names": names, "counts": counts, "mean": mean,
+                         "ci_low": mean - half_width, "ci_high": mean + half_width}
+        return self.ensemble
+
+    ## Runs the experiment at its real size, i. e. with the Well dimensions and particle numbers of the Builder and this
+    # Simulation without any reduction (e. g. \c Builder(600, 600, 420) and \c Simulation(250000, 50000)). The Well is
+    # of class Well_vectorized, populated in bulk without any per-particle objects, and processed in chunks of
+    # \c chunk_size particles. Runtime and peak memory of the NumPy arrays (as traced by tracemalloc) are reported.
+    #
+    # \param[in]  builder           Object of class Builder
+    # \param[in]  glycan_names_list see documentation for class Glycan
+    # \param[in]  glycan_types_list see documentation for class Glycan
+    # \param[in]  glycan_density    see documentation for class Glycan
+    # \param[in]  lectin_list       see documentation for class Lectin
+    # \param[in]  lectin_density    see documentation for class Lectin
+    # \param[in]  steps             Number of steps
+    # \param[in]  chunk_size        Maximum number of particles processed at once
+    # \param[in]  reducers          List of Reducers (optional, see \c simulate)
+    # \param[in]  store_events      Whether every Cytokine is stored (see \c simulate)
+    # \param[out] report            Dictionary with runtime in s, peak memory in MB and number of Cytokines produced
+    def simulateFullScale(self, builder, glycan_names_list, glycan_types_list, glycan_density, lectin_list, lectin_density, steps=126, chunk_size=65536, reducers=None, store_events=True):
+        tracing = tracemalloc.is_tracing()
+        if not tracing:
+            tracemalloc.start()
+        tracemalloc.reset_peak()
+        start_time = time.time()
+        well = self.createModel(builder, Well_vectorized, glycan_names_list, glycan_types_list, glycan_density, lectin_list, lectin_density)
+        well.chunk_size = chunk_size
+        self.simulate(well, steps, reducers=reducers, store_events=store_events)
+        runtime = time.time() - start_time
+        peak = tracemalloc.get_traced_memory()[1]
+        if not tracing:
+            tracemalloc.stop()
+        self.report = {"steps": steps, "beads": self.n_beads, "cells": self.n_decoder, "runtime_s": runtime,
+                       "peak_memory_MB": peak / 2**20, "cytokines": self.events}
+        print("Full-scale run: %d steps in %.1f s, peak memory %.1f MB, %d cytokines" % (steps, runtime, self.report["peak_memory_MB"], self.events))
+        return self.report
+
+
+## Sweep runs independent Simulations for every point of a parameter grid on a pool of worker processes. Every point
+# gets a fresh Simulation and Well, so no state is shared between points. The seed of every point is spawned from one
+# SeedSequence, hence results only depend on \c seed and the grid, but not on the number of workers or the order in
+# which points finish.
+#
+# \param[in] size           Dimensions x, y, z of the Well, passed to Builder.
+# \param[in] base           Dictionary with the parameters shared by all points. Keys are \c n_beads, \c n_cells,
+#                           \c glycan_names, \c glycan_types, \c glycan_density, \c lectins, \c lectin_density and
+#                           optionally \c cytokine_dict and \c backend (see class Simulation).
+# \param[in] steps          Number of steps of every Simulation.
+# \param[in] container_type see documentation for class Builder
+# \param[in] seed           Seed of the SeedSequence from which the seeds of all points are spawned.
+# \param[in] workers        Number of worker processes (None: number of CPUs, 1: run in this process).
+# \param[in] profile        If True, every result contains the totals of a Profiler of its run.
+class Sweep:
+    def __init__(self, size, base, steps=126, container_type=Well_vectorized, seed=None, workers=None, profile=False):
+        self.size = size
+        self.base = base
+        self.steps = steps
+        self.container_type = container_type
+        self.seed = seed
+        self.workers = workers
+        self.profile = profile
+
+    ## Runs one point of the grid.
+    #
+    # \param[in]  task   Tuple of point parameters, Well size, number of steps, container type, SeedSequence and
+    #                    profile flag.
+    # \param[out] result Dictionary with the parameters of the point, the cytokine names, their counts and the total
+    #                    (and the Profiler totals if profiled).
+    @staticmethod
+    def runPoint(task):
+        parameters, size, steps, container_type, seed_sequence, profile = task
+        model = Simulation(parameters["n_beads"], parameters["n_cells"], seed_sequence, parameters.get("backend", "numpy"),
+                           Profiler() if profile else None)
+        if "cytokine_dict" in parameters:
+            model.cytokine_dict = parameters["cytokine_dict"]
+        well = model.createModel(Builder(*size), container_type, parameters["glycan_names"], parameters["glycan_types"],
+                                 parameters["glycan_density"], parameters["lectins"], parameters["lectin_density"])
+        model.simulate(well, steps)
+        names, amounts = Analysis(model.cytokines, model.cytokineNames()).countCytokines()
+        result = {"parameters": parameters, "names": names, "amounts": amounts, "total": len(model.cytokines)}
+        if profile:
+            result["profile"] = model.profiler.totals()
+        return result
+
+    ## Runs all points of the grid and collects results as they finish.
+    #
+    # \param[in]  grid     List of dictionaries, each overriding entries of \c base for one point.
+    # \param[in]  callback Function called as callback(i, result) whenever point i has finished (optional).
+    # \param[out] results  List of results of \c runPoint in the order of \c grid.
+    def run(self, grid, callback=None):
+        seeds = np.random.SeedSequence(self.seed).spawn(len(grid))
+        tasks = [(dict(self.base, **point), self.size, self.steps, self.container_type, seeds[i], self.profile) for i, point in enumerate(grid)]
+        return self.execute(Sweep.runPoint, tasks, callback)
+
+    ## Runs \c function for all tasks on the pool of worker processes (or in this process if \c workers is 1).
+    #
+    # \param[in]  function Function called as function(task), must be picklable.
+    # \param[in]  tasks    List of tasks.
+    # \param[in]  callback Function called as callback(i, result) whenever task i has finished (optional).
+    # \param[out] results  List of results in the order of \c tasks.
+    def execute(self, function, tasks, callback=None):
+        results = [None] * len(tasks)
+        if self.workers == 1:
+            for i, task in enumerate(tasks):
+                results[i] = function(task)
+                if callback is not None:
+                    callback(i, results[i])
+            return results
+        with ProcessPoolExecutor(max_workers=self.workers) as pool:
+            futures = {pool.submit(function, task): i for i, task in enumerate(tasks)}
+            for future in as_completed(futures):
+                i = futures[future]
+                results[i] = future.result()
+                if callback is not None:
+                    callback(i, results[i])
+        return results
+
+    ## Runs replicates of one point until the confidence interval of the mean total number of Cytokines is narrow
+    # enough (see \c runAdaptive). With Well_vectorized, the replicates of a batch run together in one ensemble
+    # (see Simulation.simulateEnsemble); other containers run one Simulation per replicate.
+    #
+    # \param[in]  task   Tuple of point parameters, Well size, number of steps, container type, SeedSequence, target,
+    #                    minimum and maximum number of replicates, and confidence level.
+    # \param[out] result Dictionary with the parameters of the point, the cytokine names, their mean counts, the mean
+    #                    total and its confidence interval, the relative half-width, the number of replicates and
+    #                    whether the target was reached.
+    @staticmethod
+    def runAdaptivePoint(task):
+        parameters, size, steps, container_type, seed_sequence, target, min_replicates, max_replicates, confidence = task
+        z = NormalDist().inv_cdf(0.5 + confidence / 2)
+        counts = [] # one row of cytokine counts per replicate
+        batch = min_replicates
+        while True:
+            batch_seed = seed_sequence.spawn(1)[0]
+            if container_type is Well_vectorized:
+                model = Simulation(parameters["n_beads"], parameters["n_cells"], batch_seed)
+                if "cytokine_dict" in parameters:
+                    model.cytokine_dict = parameters["cytokine_dict"]
+                ensemble = model.simulateEnsemble(Builder(*size), parameters["glycan_names"], parameters["glycan_types"], parameters["glycan_density"],
+                                                  parameters["lectins"], parameters["lectin_density"], steps, batch, confidence)
+                names = ensemble["names"]
+                counts.extend(ensemble["counts"])
+            else:
+                for replicate_seed in batch_seed.spawn(batch):
+                    result = Sweep.runPoint((parameters, size, steps, container_type, replicate_seed, False))
+                    names = result["names"]
+                    counts.append(result["amounts"])
+            totals = np.sum(counts, axis=1)
+            n = len(totals)
+            mean = totals.mean()
+            half_width = z * totals.std(ddof=1) / np.sqrt(n) if n > 1 else np.inf
+            relative = half_width / mean if mean > 0 else np.inf
+            if relative <= target or n >= max_replicates:
+                break
+            needed = (z * totals.std(ddof=1) / (target * mean)) ** 2 if mean > 0 else 2 * n
+            batch = int(min(max(np.ceil(needed) - n, 1), n, max_replicates - n)) # at most doubling per batch
+        return {"parameters": parameters, "names": names, "amounts": np.mean(counts, axis=0).tolist(), "total": float(mean),
+                "ci_low": float(mean - half_width), "ci_high": float(mean + half_width), "relative_half_width": float(relative),
+                "replicates": n, "converged": bool(relative <= target)}
+
+    ## Runs every point of the grid with as many replicates as needed for the relative half-width of the confidence
+    # interval of the mean total number of Cytokines to drop below \c target, but at most \c max_replicates. A point
+    # starts with \c min_replicates replicates; further batches are sized by the variance observed so far (at most
+    # doubling the replicates per batch). Points converging quickly thus stop early, noisy points get more replicates.
+    #
+    # \param[in]  grid           List of dictionaries, each overriding entries of \c base for one point.
+    # \param[in]  target         Target of the relative half-width (half-width / mean) of the confidence interval.
+    # \param[in]  min_replicates Replicates of the first batch (at least 2).
+    # \param[in]  max_replicates Budget of replicates per point.
+    # \param[in]  confidence     Confidence level of the interval (normal approximation).
+    # \param[in]  callback       Function called as callback(i, result) whenever point i has finished (optional).
+    # \param[out] results        List of results of \c runAdaptivePoint in the order of \c grid.
+    def runAdaptive(self, grid, target=0.05, min_replicates=4, max_replicates=256, confidence=0.95, callback=None):
+        if min_replicates < 2 or max_replicates < min_replicates:
+            sys.exit("At least two replicates are needed and the budget must not be below min_replicates!")
+        seeds = np.random.SeedSequence(self.seed).spawn(len(grid))
+        tasks = [(dict(self.base, **point), self.size, self.steps, self.container_type, seeds[i], target, min_replicates, max_replicates, confidence)
+                 for i, point in enumerate(grid)]
+        return self.execute(Sweep.runAdaptivePoint, tasks, callback)
+
+
+## Plate simulates all Wells of a multi-well plate together in one vectorized run instead of one Simulation per Well
+# (as Sweep does). Every Well has its own parameters, including particle numbers and optionally its size. The
+# particles of all Wells are stored in one flattened Well_vectorized, together with the number of the Well of every
+# particle and, for Wells of different sizes, the size of its Well as per-particle bounds of the random walk. A step
+# moves all particles of the plate at once and finds the contacts of all Wells with one VoxelIndex grouped by Well, so
+# particles only meet particles of their own Well. Every Well draws from its own random stream spawned from \c seed,
+# hence its result does not depend on the other Wells of the plate.
+#
+# \param[in] size  Default dimensions x, y, z of the Wells (a Well may override them with the parameter "size").
+# \param[in] base  Dictionary of default parameters (keys as in class Sweep; an optional "cytokine_dict" applies to
+#                  the whole plate).
+# \param[in] steps Number of steps.
+# \param[in] seed  Seed of the SeedSequence from which the streams of all Wells are spawned (optional).
+# \param     well  Flattened Well_vectorized of the last run, with \c bead_wells and \c cell_wells (Well of every
+#                  particle) and \c bead_offsets and \c cell_offsets (first particle of every Well).
+# \param     counts Array of shape (Wells, cytokines) with the Cytokines produced in every Well of the last run.
+class Plate:
+    def __init__(self, size, base, steps=126, seed=None):
+        self.size = size
+        self.base = base
+        self.steps = steps
+        self.seed = seed
+
+    ## Builds the flattened Well_vectorized of all Wells. Every Well is populated by \c Well_vectorized.populate from
+    # its own stream; the codes of its Glycans and Lectins are translated into codes of the whole plate.
+    #
+    # \param[in]  parameters List of dictionaries with the parameters of every Well.
+    # \param[in]  streams    List of NumPy random Generators, one per Well.
+    # \param[out] well       Object of class Well_vectorized containing the particles of all Wells.
+    def build(self, parameters, streams):
+        sizes = np.array([p.get("size", self.size) for p in parameters], dtype=np.int64).reshape(-1, 3)
+        n_beads = np.array([p["n_beads"] for p in parameters], dtype=np.int64)
+        n_cells = np.array([p["n_cells"] for p in parameters], dtype=np.int64)
+        well = Well_vectorized(*sizes.max(axis=0).tolist(), int(n_beads.sum()), int(n_cells.sum()))
+        well.bead_offsets = np.concatenate([[0], np.cumsum(n_beads)])
+        well.cell_offsets = np.concatenate([[0], np.cumsum(n_cells)])
+        well.bead_wells = np.repeat(np.arange(len(parameters)), n_beads)
+        well.cell_wells = np.repeat(np.arange(len(parameters)), n_cells)
+        for w, (p, stream) in enumerate(zip(parameters, streams)):
+            part = Well_vectorized(*sizes[w].tolist(), p["n_beads"], p["n_cells"])
+            part.populate(p["glycan_names"], p["glycan_types"], p["glycan_density"], p["lectins"], p["lectin_density"], stream)
+            glycan_codes = np.array([well.glycanCode(Glycan.intern(name, type)) for name, type in zip(part.glycan_names, part.glycan_types)], dtype=np.int16)
+            lectin_codes = np.array([well.lectinCode(Lectin.intern(name)) for name in part.lectin_names], dtype=np.int16)
+            beads = slice(well.bead_offsets[w], well.bead_offsets[w + 1])
+            cells = slice(well.cell_offsets[w], well.cell_offsets[w + 1])
+            well.bead_positions[beads] = part.bead_positions
+            well.bead_glycans[beads] = glycan_codes[part.bead_glycans]
+            well.bead_densities[beads] = part.bead_densities
+            well.cell_positions[cells] = part.cell_positions
+            well.cell_lectins[cells] = lectin_codes[part.cell_lectins]
+            well.cell_densities[cells] = part.cell_densities
+        if (sizes == sizes[0]).all():
+            well.bead_bounds = well.cell_bounds = None
+        else:
+            well.bead_bounds = sizes[well.bead_wells].astype(well.bead_positions.dtype)
+            well.cell_bounds = sizes[well.cell_wells].astype(well.cell_positions.dtype)
+        return well
 
-## This class contains three methods for the analysis of the results from the Simulation.
+    ## Runs all Wells of the plate together.
+    #
+    # \param[in]  wells   List of dictionaries, each overriding entries of \c base for one Well.
+    # \param[out] results List of results in the order of \c wells, one dictionary per Well with its parameters, the
+    #                     cytokine names, their counts and the total (as returned by Sweep.runPoint).
+    def run(self, wells):
+        parameters = [dict(self.base, **point) for point in wells]
+        model = Simulation(0, 0)
+        if "cytokine_dict" in self.base:
+            model.cytokine_dict = self.base["cytokine_dict"]
+        if any(p.get("cytokine_dict", model.cytokine_dict) != model.cytokine_dict for p in parameters):
+            sys.exit("All Wells of a Plate must use the same cytokine dictionary!")
+        for p in parameters:
+            model.checkDictionary(p["glycan_types"], p["lectins"])
+        streams = [stream.generator for stream in RandomStream(self.seed).spawn(len(parameters))]
+        self.well = well = self.build(parameters, streams)
+
+        table = BindingTable(model.cytokine_dict)
+        names = table.names
+        self.counts = counts = np.zeros((len(parameters), len(names)), dtype=np.int64)
+        glycan_rows = table.rows(well.glycan_types)
+        lectin_columns = table.columns(well.lectin_names)
+        n_beads, n_cells = np.diff(well.bead_offsets), np.diff(well.cell_offsets)
+        index = VoxelIndex(well.size)
+        block = 32 # steps of the random walk are drawn in blocks of this many steps per Well
+        for n in range(self.steps): # n: step number
+            if n % block == 0:
+                length = min(block, self.steps - n)
+                choices = [stream.integers(0, 6, (n_beads[w] + n_cells[w], length), dtype=np.int8) for w, stream in enumerate(streams)]
+                bead_choices = np.concatenate([c[:n_beads[w]] for w, c in enumerate(choices)])
+                cell_choices = np.concatenate([c[n_beads[w]:] for w, c in enumerate(choices)])
+            well.randomWalk(well.bead_positions, None, bead_choices[:, n % block], well.bead_bounds)
+            well.randomWalk(well.cell_positions, None, cell_choices[:, n % block], well.cell_bounds)
+            index.build(well.bead_positions, well.bead_wells)
+            cells, beads = index.query(well.cell_positions, well.cell_wells)
+            bounds = np.searchsorted(cells, well.cell_offsets)
+            for w in np.flatnonzero(np.diff(bounds)): # pairs are sorted by cell, hence by Well
+                k = cells[bounds[w]:bounds[w + 1]]
+                l = beads[bounds[w]:bounds[w + 1]]
+                draws = streams[w].uniform(0, 10000, len(k))
+                densities = well.bead_densities[l].astype(np.float64) * well.cell_densities[k]
+                _, codes = table.resolve(glycan_rows[well.bead_glycans[l]], lectin_columns[well.cell_lectins[k]], densities, draws)
+                counts[w] += np.bincount(codes, minlength=len(names))
+        return [{"parameters": p, "names": names, "amounts": counts[w].tolist(), "total": int(counts[w].sum())}
+                for w, p in enumerate(parameters)]
+
+
+## This class contains methods for the analysis of the results from the Simulation. All computations are array
+# operations on the columns of a CytokineBuffer, so they scale to millions of Cytokines. Matplotlib is only imported by
+# the plotting methods, i. e. counting, density maps and time series work without it.
 #
-# \param[in] simulationResults The results of the simulation, i. e. the list containing the Cytokine object produced.
+# \param[in] simulationResults The results of the simulation, i. e. the CytokineBuffer (or a list of Cytokine objects,
+#                              which is converted once)
 # \param[in] cytokine_names    Names of the cytokines to be analyzed (optional)
 class Analysis:
     def __init__(self, simulationResults, cytokine_names=None):
+        if not isinstance(simulationResults, CytokineBuffer):
+            buffer = CytokineBuffer(max(len(simulationResults), 1))
+            for cytokine in simulationResults:
+                buffer.append(0, -1, -1, cytokine.name, cytokine.coordinates)
+            simulationResults = buffer
         self.results = simulationResults
+        self.events = simulationResults.view()
         if cytokine_names is None:
-            c = []
-            for i in range(len(simulationResults)):
-                c.append(simulationResults[i].name)
-            self.cytokineNames = list(set(c))
+            codes = np.unique(self.events["cytokine"])
+            self.cytokineNames = [simulationResults.names[c] for c in codes]
         else:
             self.cytokineNames=cytokine_names
 
-    ## Counts number of objects of class Cytokine of respective type, i. e. amount of cytokines produced.
+    ## Returns the codes (see CytokineBuffer) of \c cytokineNames. Names that never occurred get the code -1.
+    def codes(self):
+        return np.array([self.results.names.index(name) if name in self.results.names else -1 for name in self.cytokineNames], dtype=np.int64)
+
+    ## Counts number of Cytokines of respective type, i. e. amount of cytokines produced.
     #
     # \param[out] self.cytokineNames  List with name of cytokines.
     # \param[out] self.cytokineAmount List with amount of respective cytokine.
     def countCytokines(self):
-        self.cytokineAmount = []
-        for i in range(len(self.cytokineNames)):
-            counter = 0
-            for j in range(len(self.results)):
-                if self.cytokineNames[i] == self.results[j].name:
-                    counter += 1
-            self.cytokineAmount.append(counter)
+        amounts = np.append(np.bincount(self.events["cytokine"], minlength=len(self.results.names)), 0) # code -1: 0
+        self.cytokineAmount = amounts[self.codes()].tolist()
         return [self.cytokineNames, self.cytokineAmount]
 
+    ## Counts the Cytokines of respective type produced in every step.
+    #
+    # \param[in]  steps  Number of steps (optional, default: last step with an event + 1)
+    # \param[out] series Array of shape (cytokines, steps).
+    def timeSeries(self, steps=None):
+        if steps is None:
+            steps = int(self.events["step"].max()) + 1 if len(self.events) else 0
+        codes = self.codes()
+        series = np.zeros((len(codes), steps), dtype=np.int64)
+        mapping = np.full(len(self.results.names), -1, dtype=np.int64)
+        present = codes >= 0 # names not in the results (code -1) have no events, so their rows stay zero
+        mapping[codes[present]] = np.flatnonzero(present)
+        rows = mapping[self.events["cytokine"]]
+        selected = rows >= 0
+        np.add.at(series, (rows[selected], self.events["step"][selected]), 1)
+        return series
+
+    ## Bins the coordinates of production into a 3D density map.
+    #
+    # \param[in]  bins    Number of bins per dimension (int or sequence of three ints)
+    # \param[in]  size    Size of the Well; the map covers 0 to size in every dimension (optional, default: data range)
+    # \param[out] density Array of shape (bins_x, bins_y, bins_z) with the number of Cytokines per bin
+    # \param[out] edges   List of the three arrays of bin edges
+    def densityMap(self, bins=20, size=None):
+        bins = np.broadcast_to(np.asarray(bins, dtype=np.int64), (3,))
+        flat = np.zeros(len(self.events), dtype=np.int64)
+        inside = np.ones(len(self.events), dtype=bool)
+        edges = []
+        for axis, name in enumerate(("x", "y", "z")):
+            values = self.events[name]
+            if size is not None:
+                low, high = 0, size[axis] + 1
+            elif len(values):
+                low, high = int(values.min()), int(values.max()) + 1
+            else:
+                low, high = 0, 1
+            edges.append(np.linspace(low, high, bins[axis] + 1))
+            i = (values.astype(np.int64) - low) * bins[axis] // (high - low) # uniform bins: no search needed
+            inside &= (i >= 0) & (i < bins[axis])
+            flat = flat * bins[axis] + i
+        density = np.bincount(flat[inside], minlength=int(np.prod(bins))).reshape(bins)
+        return density, edges
+
+    ## Imports pyplot on demand, so the module can be used without Matplotlib.
+    @staticmethod
+    def pyplot():
+        import matplotlib.pyplot as plt
+        return plt
+
     ## Creates a bar graph of the numbers of each type of cytokine.
     def plotCytokines(self):
+        plt = self.pyplot()
         self.countCytokines()
         labels = self.cytokineNames
         values = self.cytokineAmount
@@ -426,24 +2761,359 @@ class Analysis:
         plt.xticks(indexes, labels)
         plt.show()
 
-    ## Creates a 3D scatter plot of the coordinates where a Bead and a DecoderCell met and produced a Cytokine.
-    def plotCoordinates(self):
-        xs=[]
-        ys=[]
-        zs=[]
-        for i in range(len(self.results)):
-            xs.append(self.results[i].coordinates[0])
-            ys.append(self.results[i].coordinates[1])
-            zs.append(self.results[i].coordinates[2])
+    ## Creates 2D density maps (projections onto the xy, xz, and yz planes) of the coordinates where a Bead and a
+    # DecoderCell met and produced a Cytokine. Instead of drawing every single event, the coordinates are binned first.
+    #
+    # \param[in] bins Number of bins per dimension
+    # \param[in] size Size of the Well (optional)
+    def plotCoordinates(self, bins=20, size=None):
+        plt = self.pyplot()
+        density, edges = self.densityMap(bins, size)
+        fig, axes = plt.subplots(1, 3, figsize=(12, 4))
+        for ax, (i, j) in zip(axes, [(0, 1), (0, 2), (1, 2)]):
+            projection = density.sum(axis=3 - i - j)
+            image = ax.imshow(projection.T, origin="lower", aspect="auto",
+                              extent=(edges[i][0], edges[i][-1], edges[j][0], edges[j][-1]))
+            ax.set_xlabel("xyz"[i])
+            ax.set_ylabel("xyz"[j])
+            fig.colorbar(image, ax=ax)
+        plt.show()
 
-        fig = plt.figure()
-        ax = fig.add_subplot(111, projection='3d')
-        ax.scatter(xs, ys, zs)
+    ## Plots the number of Cytokines of respective type produced per step.
+    def plotTimeSeries(self, steps=None):
+        plt = self.pyplot()
+        series = self.timeSeries(steps)
+        for name, counts in zip(self.cytokineNames, series):
+            plt.plot(np.arange(len(counts)), counts, label=name)
+        plt.legend(loc='upper left')
+        plt.xlabel('Step')
+        plt.ylabel('Cytokines Produced')
         plt.show()
 
+## Benchmark measures the main paths of the program for a grid of Well sizes and all container types: building the
+# model, a single move of all particles, contact detection (with the VoxelIndex of \c simulate, after an untimed
+# move of all particles), a full run, and the analysis of its results. Every
+# measurement is repeated after some warm-up runs and summarized by median and interquartile range (IQR). The full run
+# is additionally profiled once (see class Profiler); its totals are stored as \c phases. Results can
+# be saved as JSON and compared with a saved baseline to detect regressions.
+#
+# Well_vectorized is measured with every backend of Simulation ("numpy", and "numba" if Numba is installed). The
+# backends only differ in \c simulate, so with "numba" only the full run and its analysis are measured. Measurements
+# of object-based containers have the backend None.
+#
+# The grid is given as scale factors of the full-scale experiment: scale s means a Well of 600s * 600s * 420s pt with
+# 50,000 s^3 DecoderCells and five times as many Beads (s = 0.1 is the reduced Well used in the other experiments).
+#
+# \param[in] scales       Scale factors of the size grid.
+# \param[in] containers   Container types to be measured.
+# \param[in] backends     Backends measured with Well_vectorized (default: all installed).
+# \param[in] cases        Names of the cases to be measured (default: all of \c Benchmark.cases).
+# \param[in] repeats      Number of timed repetitions.
+# \param[in] warmup       Number of untimed repetitions before.
+# \param[in] steps        Number of steps of the full run.
+# \param[in] object_limit Maximum number of particles for object-based containers; larger sizes are skipped.
+# \param[in] seed         Seed of the Simulations.
+class Benchmark:
+    cases = ("build", "move", "contact", "run", "analysis")
+    lectins = ["DC-SIGN", "Dectin-1"]
+    glycans = ["Mannan", "Lewis-Y"]
+    glycans_types = ["Man", "Fuc"]
+
+    def __init__(self, scales=(0.1, 0.2, 0.5, 1.0), containers=(Well_list, Well_npArray, Well_vectorized), cases=None,
+                 repeats=5, warmup=1, steps=126, object_limit=30000, seed=0, backends=None):
+        self.scales = scales
+        self.containers = containers
+        self.backends = (("numpy", "numba") if Engine.numbaInstalled() else ("numpy",)) if backends is None else backends
+        self.selected = self.cases if cases is None else cases
+        self.repeats = repeats
+        self.warmup = warmup
+        self.steps = steps
+        self.object_limit = object_limit
+        self.seed = seed
+
+    ## Times a function. If \c setup is given, it is called (untimed) before every repetition and its return value is
+    # passed to \c function.
+    #
+    # \param[in]  function Function to be timed.
+    # \param[in]  setup    Function preparing the argument of \c function (optional).
+    # \param[out] timing   Dictionary with all times in s, their median and IQR.
+    def measure(self, function, setup=None):
+        times = []
+        for i in range(self.warmup + self.repeats):
+            argument = None if setup is None else setup()
+            start_time = time.perf_counter()
+            function() if setup is None else function(argument)
+            if i >= self.warmup:
+                times.append(time.perf_counter() - start_time)
+        q1, median, q3 = np.percentile(times, [25, 50, 75])
+        return {"times": times, "median": float(median), "iqr": float(q3 - q1)}
+
+    ## Builds a model of the given scale, container type and backend.
+    def model(self, scale, container_type, backend=None):
+        n_cells = max(int(round(50000 * scale**3)), 1)
+        model = Simulation(5 * n_cells, n_cells, self.seed, backend or "numpy")
+        builder = Builder(max(int(round(600 * scale)), 1), max(int(round(600 * scale)), 1), max(int(round(420 * scale)), 1))
+        well = model.createModel(builder, container_type, self.glycans, self.glycans_types, 50, self.lectins, 50)
+        return model, builder, well
+
+    ## Runs all measurements.
+    #
+    # \param[in]  progress Function called with a short message after every measurement (optional).
+    # \param[out] results  Dictionary with metadata and the list of measurements.
+    def run(self, progress=print):
+        measurements = []
+        for scale in self.scales:
+            for container_type, backend in [(c, b) for c in self.containers for b in (self.backends if c is Well_vectorized else (None,))]:
+                n_cells = max(int(round(50000 * scale**3)), 1)
+                if container_type is not Well_vectorized and 6 * n_cells > self.object_limit:
+                    continue
+                selected = [case for case in self.selected if backend in (None, "numpy") or case in ("run", "analysis")]
+                model, builder, well = self.model(scale, container_type, backend)
+                index = VoxelIndex(well.size)
+                timings = {}
+                if "build" in selected:
+                    timings["build"] = self.measure(lambda: model.createModel(builder, container_type, self.glycans, self.glycans_types, 50, self.lectins, 50))
+                if "move" in selected:
+                    timings["move"] = self.measure(lambda: model.moveParticles(well))
+                if "contact" in selected:
+                    model.indexBeads(well, index)
+                    timings["contact"] = self.measure(lambda _: (model.indexBeads(well, index), model.findContacts(well, index)), lambda: model.moveParticles(well))
+                if "run" in selected or "analysis" in selected:
+                    timings["run"] = self.measure(lambda m: m[0].simulate(m[2], self.steps), lambda: self.model(scale, container_type, backend))
+                    model.profiler = Profiler()
+                    cytokines = model.simulate(well, self.steps)
+                    timings["run"]["phases"] = model.profiler.totals()
+                    model.profiler = None
+                if "analysis" in selected:
+                    timings["analysis"] = self.measure(lambda: (lambda a: (a.countCytokines(), a.timeSeries(self.steps), a.densityMap(20, well.size)))(Analysis(cytokines)))
+                for case in selected:
+                    measurements.append(dict(case=case, container=container_type.__name__, backend=backend, scale=scale, n_cells=n_cells,
+                                             n_beads=5 * n_cells, size=[int(s) for s in well.size], **timings[case]))
+                    if progress is not None:
+                        progress("%-8s %-15s %-6s scale %-5g median %.4g s (IQR %.2g s)" % (case, container_type.__name__, backend or "", scale, timings[case]["median"], timings[case]["iqr"]))
+        self.results = {"meta": {"python": platform.python_version(), "numpy": np.__version__, "machine": platform.machine(),
+                                 "repeats": self.repeats, "warmup": self.warmup, "steps": self.steps, "seed": self.seed},
+                        "measurements": measurements}
+        return self.results
+
+    ## Saves the results of \c run as JSON.
+    def save(self, path):
+        with open(path, "w") as f:
+            json.dump(self.results, f, indent=1)
+
+    ## Loads results saved by \c save.
+    @staticmethod
+    def load(path):
+        with open(path) as f:
+            return json.load(f)
+
+    ## Compares results with a baseline. A measurement is flagged as regression if its median exceeds the median of the
+    # same case, container, backend and scale in the baseline by more than \c tolerance (relative). Baselines without
+    # backends count as "numpy" for Well_vectorized.
+    #
+    # \param[in]  results     Results of \c run (or \c load)
+    # \param[in]  baseline    Baseline results
+    # \param[in]  tolerance   Accepted relative slowdown
+    # \param[out] regressions List of dictionaries with case, container, backend, scale, both medians and their ratio
+    @staticmethod
+    def compare(results, baseline, tolerance=0.25):
+        def key(m):
+            backend = m.get("backend", "numpy" if m["container"] == "Well_vectorized" else None)
+            return (m["case"], m["container"], backend, m["scale"])
+        reference = {key(m): m["median"] for m in baseline["measurements"]}
+        regressions = []
+        for m in results["measurements"]:
+            if key(m) in reference and m["median"] > (1 + tolerance) * reference[key(m)]:
+                regressions.append({"case": m["case"], "container": m["container"], "backend": key(m)[2], "scale": m["scale"],
+                                    "baseline": reference[key(m)], "median": m["median"], "ratio": m["median"] / reference[key(m)]})
+        return regressions
+
+
+## ResultCache stores results of finished runs on disk, one JSON file per key. Keys are hashes of everything a result
+# depends on (see \c key), including the source code of this program, so results of older versions are never reused.
+# Reading a result marks it as recently used; when the cache grows beyond \c max_bytes, the least recently used
+# results are deleted.
+#
+# \param[in] directory Directory of the cache. Created if necessary.
+# \param[in] max_bytes Size limit of the cache in bytes.
+class ResultCache:
+    version = None
+
+    def __init__(self, directory, max_bytes=100 * 2**20):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        os.makedirs(directory, exist_ok=True)
+
+    ## Returns the hash of the source code of this program, computed once.
+    @staticmethod
+    def codeVersion():
+        if ResultCache.version is None:
+            with open(os.path.abspath(__file__), "rb") as f:
+                ResultCache.version = hashlib.sha256(f.read()).hexdigest()
+        return ResultCache.version
+
+    ## Returns the key of a specification: the SHA-256 hash of its canonical JSON form and the code version.
+    @staticmethod
+    def key(spec):
+        text = json.dumps({"spec": spec, "code": ResultCache.codeVersion()}, sort_keys=True)
+        return hashlib.sha256(text.encode()).hexdigest()
+
+    ## Returns the path of the result with the given key.
+    def path(self, key):
+        return os.path.join(self.directory, key + ".json")
+
+    ## Returns the result with the given key, or None if it is not cached.
+    def get(self, key):
+        try:
+            with open(self.path(key)) as f:
+                result = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+        os.utime(self.path(key)) # mark as recently used
+        return result
+
+    ## Stores a result and evicts the least recently used results if the cache is too large.
+    def put(self, key, result):
+        temporary = self.path(key) + ".tmp"
+        with open(temporary, "w") as f:
+            json.dump(result, f)
+        os.replace(temporary, self.path(key))
+        self.evict()
+
+    ## Deletes the least recently used results until the cache fits into \c max_bytes.
+    def evict(self):
+        entries = []
+        for name in os.listdir(self.directory):
+            if name.endswith(".json"):
+                stat = os.stat(os.path.join(self.directory, name))
+                entries.append((stat.st_mtime, stat.st_size, name))
+        total = sum(size for _, size, _ in entries)
+        for _, size, name in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            os.remove(os.path.join(self.directory, name))
+            total -= size
+
+
+## Batch runs experiments described by a specification (JSON, or TOML with Python 3.11+) without any interaction, e.g.
+#
+#     {"size": [60, 60, 42], "steps": 126, "replicates": 10, "seed": 1, "engine": "numpy", "container": "Well_vectorized",
+#      "base": {"n_beads": 250, "n_cells": 50, "glycan_names": ["Mannan", "Lewis-Y"], "glycan_types": ["Man", "Fuc"],
+#               "glycan_density": 50, "lectins": ["DC-SIGN", "Dectin-1"], "lectin_density": 50},
+#      "grid": [{"n_cells": 50}, {"n_cells": 100}]}
+#
+# Every point of \c grid (default: the base only) runs \c replicates Simulations, whose seeds are derived from \c seed
+# and the point itself, so a point gives the same result in every sweep it occurs in. Results of points are kept in a
+# ResultCache; only points not found there are computed (on the worker processes of a Sweep). Without a seed, results
+# are not cached.
+#
+# \param[in] spec    Dictionary with the specification (keys as above; \c base as in class Sweep)
+# \param[in] cache   Object of class ResultCache (optional)
+# \param[in] workers Number of worker processes (see class Sweep)
+class Batch:
+    containers = {"Well_list": Well_list, "Well_npArray": Well_npArray, "Well_vectorized": Well_vectorized}
+
+    def __init__(self, spec, cache=None, workers=None):
+        self.spec = spec
+        self.cache = cache
+        self.workers = workers
+
+    ## Loads a specification from a JSON or TOML file.
+    @staticmethod
+    def load(path):
+        if path.endswith(".toml"):
+            try:
+                import tomllib
+            except ImportError:
+                sys.exit("TOML specifications require Python 3.11 or newer!")
+            with open(path, "rb") as f:
+                return tomllib.load(f)
+        with open(path) as f:
+            return json.load(f)
+
+    ## Returns the specification of a single point, i. e. everything its result depends on.
+    def pointSpec(self, point):
+        spec = self.spec
+        return {"size": list(spec["size"]), "steps": spec.get("steps", 126), "replicates": spec.get("replicates", 1),
+                "seed": spec.get("seed"), "container": spec.get("container", "Well_vectorized"),
+                "parameters": dict(spec["base"], backend=spec.get("engine", "numpy"), **point)}
+
+    ## Returns the SeedSequence of a point, derived from its seed and the hash of its specification (fresh entropy if
+    # it has no seed).
+    @staticmethod
+    def pointSeed(point):
+        if point["seed"] is None:
+            return np.random.SeedSequence()
+        digest = hashlib.sha256(json.dumps(point, sort_keys=True).encode()).digest()
+        return np.random.SeedSequence([int.from_bytes(digest[i:i + 4], "little") for i in range(0, 16, 4)])
+
+    ## Runs all points and returns their results in the order of the grid. Every result contains the parameters, the
+    # cytokine names, their mean amounts, the totals of all replicates, their mean and confidence interval (95 %), and
+    # whether it was taken from the cache.
+    def run(self):
+        points = [self.pointSpec(point) for point in self.spec.get("grid", [{}])]
+        keys = [ResultCache.key(point) for point in points]
+        results = [None] * len(points)
+        if self.cache is not None:
+            for i, point in enumerate(points):
+                if point["seed"] is not None:
+                    results[i] = self.cache.get(keys[i])
+                    if results[i] is not None:
+                        results[i]["cached"] = True
+        missing = [i for i in range(len(points)) if results[i] is None]
+        tasks, owners = [], []
+        for i in missing:
+            point = points[i]
+            if point["container"] not in self.containers:
+                sys.exit("Unknown container! Please choose one of " + ", ".join(self.containers) + ".")
+            for replicate_seed in self.pointSeed(point).spawn(point["replicates"]):
+                tasks.append((point["parameters"], point["size"], point["steps"], self.containers[point["container"]], replicate_seed, False))
+                owners.append(i)
+        runs = Sweep(self.spec["size"], self.spec["base"], workers=self.workers).execute(Sweep.runPoint, tasks)
+        z = NormalDist().inv_cdf(0.975)
+        for i in missing:
+            replicates = [run for run, owner in zip(runs, owners) if owner == i]
+            totals = np.array([run["total"] for run in replicates], dtype=np.float64)
+            half_width = z * totals.std(ddof=1) / np.sqrt(len(totals)) if len(totals) > 1 else 0.0
+            results[i] = {"parameters": points[i]["parameters"], "names": replicates[0]["names"],
+                          "amounts": np.mean([run["amounts"] for run in replicates], axis=0).tolist(),
+                          "totals": totals.tolist(), "total": float(totals.mean()),
+                          "ci_low": float(totals.mean() - half_width), "ci_high": float(totals.mean() + half_width)}
+            if self.cache is not None and points[i]["seed"] is not None:
+                self.cache.put(keys[i], results[i])
+            results[i]["cached"] = False
+        return results
+
+    ## Command line interface: runs the specification given as first argument and writes the results as JSON.
+    #
+    # \param[in] argv Command line arguments without the program name.
+    @staticmethod
+    def main(argv):
+        parser = argparse.ArgumentParser(description="Runs a simulation experiment from a JSON or TOML specification.")
+        parser.add_argument("spec", help="specification file (.json or .toml)")
+        parser.add_argument("--cache", default=".ccp_cache", help="directory of the result cache (default: .ccp_cache)")
+        parser.add_argument("--cache-size", type=float, default=100, help="size limit of the cache in MB (default: 100)")
+        parser.add_argument("--no-cache", action="store_true", help="neither read nor write the result cache")
+        parser.add_argument("--workers", type=int, default=None, help="number of worker processes (default: number of CPUs)")
+        parser.add_argument("--output", default=None, help="file for the results (default: standard output)")
+        arguments = parser.parse_args(argv)
+        cache = None if arguments.no_cache else ResultCache(arguments.cache, int(arguments.cache_size * 2**20))
+        results = Batch(Batch.load(arguments.spec), cache, arguments.workers).run()
+        if arguments.output is None:
+            json.dump(results, sys.stdout, indent=1)
+            print()
+        else:
+            with open(arguments.output, "w") as f:
+                json.dump(results, f, indent=1)
+        return 0
+
+
 ## Main dings?
 if __name__ == "__main__":
-    experiment = input("Choose type of experiment! (Standard / Lectins / Particle_Ratio / Density_Glycans / Runtime) ")
+    if len(sys.argv) > 1: # batch mode, see class Batch
+        sys.exit(Batch.main(sys.argv[1:]))
+    import matplotlib.pyplot as plt # for plotting
+    experiment = input("Choose type of experiment! (Standard / Full_Scale / Lectins / Particle_Ratio / Density_Glycans / Runtime) ")
     if experiment == "Standard":
         lectins = ["DC-SIGN", "Dectin-1"]
         glycans = ["Mannan", "Lewis-Y"]
@@ -457,18 +3127,25 @@ if __name__ == "__main__":
 #        Analysis(model.cytokines).plotCoordinates()
 
 
+    elif experiment == "Full_Scale":
+        lectins = ["DC-SIGN", "Dectin-1"]
+        glycans = ["Mannan", "Lewis-Y"]
+        glycans_types = ["Man", "Fuc"]
+
+        model = Simulation(250000, 50000)
+        builder = Builder(600, 600, 420)
+        model.simulateFullScale(builder, glycans, glycans_types, 50, lectins, 50, 126)
+        Analysis(model.cytokines).plotCytokines()
+
     elif experiment == "Lectins":
-        results = []
         lectins = [["DC-SIGN"], ["Dectin-1"], ["DC-SIGN", "Dectin-1"]]
         glycans = ["Mannan", "Lewis-Y"]
         glycans_types = ["Man", "Fuc"]
         cytokine_types = ["IL-6", "IL-27p28"]
-        builder = Builder(60, 60, 42)
-        for i in range(len(lectins)):
-            model = Simulation(250, 50)
-            well = model.createModel(builder, Well_list, glycans, glycans_types, 50, lectins[i], 10)
-            model.simulate(well, 126)
-            results.append(Analysis(model.cytokines, cytokine_types).countCytokines())
+        base = {"n_beads": 250, "n_cells": 50, "glycan_names": glycans, "glycan_types": glycans_types,
+                "glycan_density": 50, "lectin_density": 10}
+        plate = Plate((60, 60, 42), base, 126)
+        results = [[r["names"], r["amounts"]] for r in plate.run([{"lectins": l} for l in lectins])]
 
         plt.figure(1)
 
@@ -502,20 +3179,20 @@ if __name__ == "__main__":
         lectins = ["DC-SIGN", "Dectin-1"]
         glycans = ["Mannan", "Lewis-Y"]
         glycans_types = ["Man", "Fuc"]
-        c = []
         r_range = [0.05, 0.1, 0.25, 0.5, 0.75, 1, 2.5, 5, 7.5, 10, 25]
-        builder = Builder(60, 60, 42)
         n_total = 300
+        grid = []
         for i in range(len(r_range)):
             n_cells = int(300/(r_range[i]+1)) # rounds number to int
-            n_beads = n_total-n_cells
-            model = Simulation(n_beads, n_cells)
-            well = model.createModel(builder, Well_list, glycans, glycans_types, 50, lectins, 50)
-            model.simulate(well, 126)
-            c.append(len(model.cytokines))
+            grid.append({"n_beads": n_total-n_cells, "n_cells": n_cells})
+        base = {"glycan_names": glycans, "glycan_types": glycans_types, "glycan_density": 50,
+                "lectins": lectins, "lectin_density": 50}
+        results = Sweep((60, 60, 42), base, 126, Well_vectorized).runAdaptive(grid, target=0.1, max_replicates=512)
+        c = [r["total"] for r in results]
+        print("Replicates per ratio:", dict(zip(r_range, [r["replicates"] for r in results])))
 
         fig = plt.figure()
-        plt.scatter(r_range, c, c='b', marker="s")
+        plt.errorbar(r_range, c, yerr=[r["total"] - r["ci_low"] for r in results], c='b', marker="s", linestyle="none")
         plt.ylim(ymin=0)  # adjust the min leaving max unchanged
         plt.xlabel('Cell-to-Bead Ratio')
         plt.ylabel('Total Amount of Cytokines')
@@ -526,14 +3203,10 @@ if __name__ == "__main__":
         lectins = ["DC-SIGN", "Dectin-1"]
         glycans = ["Mannan", "Lewis-Y"]
         glycans_types = ["Man", "Fuc"]
-        c = []
         DG_range = [10, 25, 50, 75, 100]
-        builder = Builder(60, 60, 42)
-        model = Simulation(250, 50)
-        for i in range(len(DG_range)):
-            well = model.createModel(builder, Well_list, glycans, glycans_types, i, lectins, 50)
-            model.simulate(well, 126)
-            c.append(len(model.cytokines))
+        base = {"n_beads": 250, "n_cells": 50, "glycan_names": glycans, "glycan_types": glycans_types,
+                "lectins": lectins, "lectin_density": 50}
+        c = [r["total"] for r in Plate((60, 60, 42), base, 126).run([{"glycan_density": d} for d in DG_range])]
 
         fig = plt.figure()
         plt.scatter(DG_range, c, c='b', marker="s")
@@ -543,33 +3216,21 @@ if __name__ == "__main__":
 
 
     elif experiment == "Runtime":
-        lectins = ["DC-SIGN", "Dectin-1"]
-        glycans = ["Mannan", "Lewis-Y"]
-        glycans_types = ["Man", "Fuc"]
-        t_list = []
-        t_npArray = []
-        n_range = [1, 5, 10, 25, 50, 100, 250, 500]
-        for i in range(len(n_range)):
-            n_cells=n_range[i]
-            n_beads = 5*n_cells
-            n_total = n_cells + n_beads
-            model = Simulation(n_beads, n_cells)
-            builder = Builder(60, 60, 42)
-            start_time = time.time()
-            well = model.createModel(builder, Well_list, glycans, glycans_types, 50, lectins, 50)
-            model.simulate(well, 1)
-            t_list.append(time.time() - start_time)
-            start_time = time.time()
-            well = model.createModel(builder, Well_npArray, glycans, glycans_types, 50, lectins, 50)
-            model.simulate(well, 1)
-            t_npArray.append(time.time() - start_time)
+        benchmark = Benchmark()
+        results = benchmark.run()
+        benchmark.save("benchmark.json")
+        if os.path.exists("benchmark_baseline.json"):
+            for r in Benchmark.compare(results, Benchmark.load("benchmark_baseline.json")):
+                print("Regression: %s %s %s scale %g: %.4g s -> %.4g s (x%.2f)" % (r["case"], r["container"], r["backend"] or "", r["scale"], r["baseline"], r["median"], r["ratio"]))
 
         fig = plt.figure()
-        plt.semilogy(n_range, t_list, c='b', marker="s", label='list')
-        plt.semilogy(n_range, t_npArray, c='r', marker="o", label='npArray')
+        for container_type, backend, style in [(Well_list, None, "bs-"), (Well_npArray, None, "ro-"), (Well_vectorized, "numpy", "g^-"), (Well_vectorized, "numba", "mv-")]:
+            runs = [m for m in results["measurements"] if m["case"] == "run" and m["container"] == container_type.__name__ and m["backend"] == backend]
+            if runs:
+                plt.loglog([m["n_cells"] for m in runs], [m["median"] for m in runs], style, label=container_type.__name__ + (" (%s)" % backend if backend else ""))
         plt.legend(loc='upper left')
         plt.xlabel('Number of Cells')
-        plt.ylabel('Runtime / s')
+        plt.ylabel('Runtime of %d steps / s' % benchmark.steps)
         plt.show()
     else:
         exit("Could not interpret key input. Input must be exactly as specified in the brackets in the promt statement.")
\ No newline at end of file
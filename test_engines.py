@@ -0,0 +1,49 @@
+## Tests of the backends of Simulation (see class Engine). Skipped if Numba is not installed.
+import numpy as np
+import pytest
+
+pytest.importorskip("numba")
+
+from CCP_Hannes import Builder, Engine_numba, Simulation, VoxelIndex, Well_vectorized
+
+lectins = ["DC-SIGN", "Dectin-1"]
+glycans = ["Mannan", "Lewis-Y"]
+glycans_types = ["Man", "Fuc"]
+
+
+## Returns a populated Well_vectorized of the given size.
+def createWell(n_beads, n_cells, size, seed):
+    model = Simulation(n_beads, n_cells, seed)
+    return model, model.createModel(Builder(*size), Well_vectorized, glycans, glycans_types, 50, lectins, 50)
+
+
+## The pairs found by Engine_numba must be exactly those of a VoxelIndex at the positions after the step.
+def test_numba_pairs_match_voxel_index():
+    model, well = createWell(2000, 2000, (9, 9, 9), 1)
+    engine = Engine_numba()
+    engine.prepare(well)
+    total = 0
+    for n in range(10):
+        cells, beads = engine.step(well, model.rng)
+        index = VoxelIndex(well.size)
+        index.build(well.bead_positions)
+        expected_cells, expected_beads = index.query(well.cell_positions)
+        np.testing.assert_array_equal(cells, expected_cells)
+        np.testing.assert_array_equal(beads, expected_beads)
+        total += len(cells)
+    assert total > 0
+
+
+## The mean numbers of Cytokines of both backends must agree within four standard errors.
+def test_numba_totals_match_numpy():
+    totals = {}
+    for backend in ("numpy", "numba"):
+        totals[backend] = []
+        for seed in range(20):
+            model = Simulation(2000, 400, seed, backend)
+            well = model.createModel(Builder(60, 60, 42), Well_vectorized, glycans, glycans_types, 50, lectins, 50)
+            model.simulate(well, 60)
+            totals[backend].append(len(model.cytokines))
+    a, b = np.array(totals["numpy"], dtype=float), np.array(totals["numba"], dtype=float)
+    standard_error = np.sqrt(a.var(ddof=1) / len(a) + b.var(ddof=1) / len(b))
+    assert abs(a.mean() - b.mean()) <= 4 * standard_error
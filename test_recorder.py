@@ -0,0 +1,58 @@
+## Tests of class Recorder.
+import numpy as np
+import pytest
+
+from CCP_Hannes import Builder, CellTally, CytokineCounts, RandomStream, Recorder, Simulation, StepSeries, Well_vectorized
+
+
+## Returns a Simulation with the given bit generator and its populated Well_vectorized.
+def createModel(bit_generator):
+    model = Simulation(2500, 500, RandomStream(9, bit_generator))
+    return model, model.createModel(Builder(30, 30, 20), Well_vectorized, ["Mannan", "Lewis-Y"], ["Man", "Fuc"], 50, ["DC-SIGN", "Dectin-1"], 50)
+
+
+## Recorder interrupted by an exception after step \c crash.
+class CrashingRecorder(Recorder):
+    crash = 29
+
+    def record(self, n, simulation, well):
+        if n == self.crash:
+            raise RuntimeError("crash")
+        super().record(n, simulation, well)
+
+
+## A run resumed from a checkpoint must produce the same events and positions as an uninterrupted run.
+@pytest.mark.parametrize("bit_generator", ["PCG64", "Philox"])
+def test_resume_matches_uninterrupted_run(tmp_path, bit_generator):
+    model, well = createModel(bit_generator)
+    expected = model.simulate(well, 60).view()
+    model, well = createModel(bit_generator)
+    with pytest.raises(RuntimeError):
+        model.simulate(well, 60, CrashingRecorder(str(tmp_path), every=2, checkpoint_every=8))
+    model, well = createModel(bit_generator)
+    model.simulate(well, 60, Recorder(str(tmp_path), every=2, checkpoint_every=8))
+    recording = Recorder.load(str(tmp_path))
+    np.testing.assert_array_equal(recording["events"].view(), expected)
+    np.testing.assert_array_equal(recording["beads"][-1], well.bead_positions)
+
+
+## Without stored events, the recording must still contain all events, and reducers of a resumed run must get the same
+# results as those of an uninterrupted run.
+def test_resume_without_stored_events(tmp_path):
+    model, well = createModel("PCG64")
+    expected = model.simulate(well, 60).view()
+    reducers = [CytokineCounts(), StepSeries(), CellTally()]
+    model, well = createModel("PCG64")
+    model.simulate(well, 60, reducers=reducers)
+    model, well = createModel("PCG64")
+    with pytest.raises(RuntimeError):
+        model.simulate(well, 60, CrashingRecorder(str(tmp_path), every=2, checkpoint_every=8), store_events=False)
+    resumed = [CytokineCounts(), StepSeries(), CellTally()]
+    model, well = createModel("PCG64")
+    cytokines = model.simulate(well, 60, Recorder(str(tmp_path), every=2, checkpoint_every=8), reducers=resumed, store_events=False)
+    assert len(cytokines) == 0
+    assert model.events == len(expected)
+    np.testing.assert_array_equal(Recorder.load(str(tmp_path))["events"].view(), expected)
+    assert resumed[0].result() == reducers[0].result()
+    np.testing.assert_array_equal(resumed[1].result(), reducers[1].result())
+    np.testing.assert_array_equal(resumed[2].result(), reducers[2].result())